@@ -0,0 +1,90 @@
+"""Meteogram payloads for the benchmarks.
+
+Recorded graf.meteogram responses can be replayed from JSON files, the synthetic
+ones follow the same shape and cover sizes and data defects seen in the wild.
+"""
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+import json
+from pathlib import Path
+import random
+from typing import Any, Callable, Dict
+from custom_components.aladin_online.forecast import ICON_CONDITION_MAP
+
+FIXTURES_DIRECTORY = Path(__file__).parent / "fixtures"
+
+DAYTIME_ICONS = [10, 20, 40, 41, 60, 61, 66, 70, 71, 80, 81, 90]
+UNKNOWN_ICONS = [1, 99, 255]
+OPTIONAL_KEYS = ["mslp", "rh2m", "cloudsTot", "windSpeed", "windGustSpeed", "windDirection", "prec", "snow"]
+
+
+def synthetic_meteogram(
+	hours: int = 72,
+	start: datetime | None = None,
+	missing_ratio: float = 0,
+	unknown_icon_ratio: float = 0,
+	seed: int = 0,
+) -> Dict[str, Any]:
+	generator = random.Random(seed)
+
+	if start is None:
+		# The model run that started before the current hour
+		start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+
+	entries = []
+	for hour in range(hours):
+		icon = generator.choice(DAYTIME_ICONS)
+		if generator.random() < unknown_icon_ratio:
+			icon = generator.choice(UNKNOWN_ICONS)
+		elif ((start.hour + hour) % 24 < 6 or (start.hour + hour) % 24 >= 20) and icon + 100 in ICON_CONDITION_MAP:
+			# Only some conditions have a night variant
+			icon += 100
+
+		entry = {
+			"validityTime": (start + timedelta(hours=hour)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+			"t2m": round(8 + 6 * generator.random() + (hour % 24) * 0.4, 1),
+			"mslp": round(1005 + 15 * generator.random(), 1),
+			"rh2m": round(45 + 50 * generator.random(), 1),
+			"cloudsTot": round(100 * generator.random(), 1),
+			"windSpeed": round(8 * generator.random(), 1),
+			"windGustSpeed": round(14 * generator.random(), 1),
+			"windDirection": round(360 * generator.random(), 1),
+			"prec": round(max(generator.gauss(0, 1), 0), 1),
+			"snow": 0,
+			"icon": icon,
+		}
+
+		for key in OPTIONAL_KEYS:
+			if generator.random() < missing_ratio:
+				del entry[key]
+
+		entries.append(entry)
+
+	return {"data": entries}
+
+
+SYNTHETIC_FIXTURES: Dict[str, Callable[[], Dict[str, Any]]] = {
+	"short": lambda: synthetic_meteogram(hours=24),
+	"default": lambda: synthetic_meteogram(hours=72),
+	"long": lambda: synthetic_meteogram(hours=240),
+	"missing_fields": lambda: synthetic_meteogram(hours=72, missing_ratio=0.2),
+	"unknown_icons": lambda: synthetic_meteogram(hours=72, unknown_icon_ratio=0.1),
+}
+
+
+def load_fixture(name: str) -> Dict[str, Any]:
+	"""Synthetic fixture by name, or a recorded response by path or by name in the fixtures directory."""
+	if name in SYNTHETIC_FIXTURES:
+		return SYNTHETIC_FIXTURES[name]()
+
+	path = Path(name)
+	if not path.exists():
+		path = FIXTURES_DIRECTORY / "{}.json".format(name)
+
+	with path.open("rb") as file:
+		return json.load(file)
+
+
+def available_fixtures() -> list[str]:
+	recorded = sorted(path.stem for path in FIXTURES_DIRECTORY.glob("*.json")) if FIXTURES_DIRECTORY.exists() else []
+	return list(SYNTHETIC_FIXTURES) + recorded
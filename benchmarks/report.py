@@ -0,0 +1,81 @@
+"""Latency, throughput and allocation figures of the benchmark stages."""
+from __future__ import annotations
+import math
+from typing import Any, Dict, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+	if not sorted_values:
+		return math.nan
+
+	position = (len(sorted_values) - 1) * fraction
+	lower = math.floor(position)
+	upper = math.ceil(position)
+
+	return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class StageResult:
+
+	__slots__ = ("name", "durations", "errors", "allocated", "peak")
+
+	def __init__(self, name: str) -> None:
+		self.name: str = name
+		self.durations: List[float] = []
+		self.errors: int = 0
+		self.allocated: int | None = None
+		self.peak: int | None = None
+
+	def as_dict(self) -> Dict[str, Any]:
+		durations = sorted(self.durations)
+		total = sum(durations)
+
+		return {
+			"stage": self.name,
+			"iterations": len(durations),
+			"errors": self.errors,
+			"mean_ms": total / len(durations) * 1000 if durations else math.nan,
+			"p50_ms": percentile(durations, 0.5) * 1000,
+			"p95_ms": percentile(durations, 0.95) * 1000,
+			"p99_ms": percentile(durations, 0.99) * 1000,
+			"max_ms": durations[-1] * 1000 if durations else math.nan,
+			"throughput": len(durations) / total if total > 0 else math.nan,
+			"allocated_kib": self.allocated / 1024 if self.allocated is not None else None,
+			"peak_kib": self.peak / 1024 if self.peak is not None else None,
+		}
+
+
+# Name, width and number of decimals of the table columns
+COLUMNS = [
+	("iterations", 10, 0),
+	("errors", 7, 0),
+	("mean_ms", 10, 3),
+	("p50_ms", 10, 3),
+	("p95_ms", 10, 3),
+	("p99_ms", 10, 3),
+	("max_ms", 10, 3),
+	("throughput", 12, 1),
+	("allocated_kib", 14, 1),
+	("peak_kib", 10, 1),
+]
+STAGE_WIDTH = 22
+
+
+def format_table(results: List[StageResult]) -> str:
+	header = "{:<{}}".format("stage", STAGE_WIDTH) + "".join(" {:>{}}".format(name, width) for name, width, _ in COLUMNS)
+	lines = [header, "-" * len(header)]
+
+	for result in results:
+		row = result.as_dict()
+		line = "{:<{}}".format(row["stage"], STAGE_WIDTH)
+
+		for name, width, decimals in COLUMNS:
+			value = row[name]
+			if value is None:
+				line += " {:>{}}".format("-", width)
+			else:
+				line += " {:>{}.{}f}".format(value, width, decimals)
+
+		lines.append(line)
+
+	return "\n".join(lines)
@@ -0,0 +1,236 @@
+"""Offline benchmark of the refresh pipeline.
+
+Run from the repository root with Home Assistant installed:
+
+	python -m benchmarks.run --fixture default --iterations 200 --latency 50
+"""
+from __future__ import annotations
+from aiohttp import ThreadedResolver
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+from time import perf_counter
+import tracemalloc
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, List
+
+from homeassistant.config_entries import ConfigEntries
+from homeassistant.const import CONF_LATITUDE, CONF_LONGITUDE, CONF_NAME
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import aiohttp_client, frame
+
+from custom_components.aladin_online import api
+from custom_components.aladin_online.aladin_online import AladinOnlineCoordinator
+from custom_components.aladin_online.cache import get_cache
+from custom_components.aladin_online.const import CONF_FORECAST_FIELDS, CONF_FORECAST_HORIZON, CONF_INTERPOLATION
+from custom_components.aladin_online.forecast import AladinForecast
+from custom_components.aladin_online.sensor import SENSORS, SensorEntity
+from custom_components.aladin_online.weather import WeatherEntity
+
+from .fixtures import available_fixtures, load_fixture
+from .report import format_table, StageResult
+from .server import AladinStandInServer
+
+STAGES = [
+	"fetch",
+	"revalidate",
+	"parse",
+	"update",
+	"update_cached",
+	"weather_attributes",
+	"weather_forecast",
+	"sensor_attributes",
+]
+
+type Stage = Callable[[], Awaitable[Any]]
+
+
+class LocalResolver(ThreadedResolver):
+	"""The stand-in server is local, Home Assistant's zeroconf aware resolver is not needed."""
+
+	async def real_close(self) -> None:
+		await self.close()
+
+
+async def measure(name: str, stage: Stage, iterations: int, warmup: int, allocation_iterations: int) -> StageResult:
+	result = StageResult(name)
+
+	for _ in range(warmup):
+		try:
+			await stage()
+		except Exception:
+			pass
+
+	for _ in range(iterations):
+		start = perf_counter()
+		try:
+			await stage()
+		except Exception:
+			result.errors += 1
+			continue
+		result.durations.append(perf_counter() - start)
+
+	# Allocations are traced separately, tracing slows the code down
+	if allocation_iterations > 0:
+		tracemalloc.start()
+		before, _ = tracemalloc.get_traced_memory()
+		tracemalloc.reset_peak()
+
+		for _ in range(allocation_iterations):
+			try:
+				await stage()
+			except Exception:
+				pass
+
+		after, peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+
+		result.allocated = (after - before) // allocation_iterations
+		result.peak = peak - before
+
+	return result
+
+
+async def run(arguments: argparse.Namespace) -> List[StageResult]:
+	payload = load_fixture(arguments.fixture)
+
+	server = AladinStandInServer(payload, latency=arguments.latency / 1000, error_rate=arguments.error_rate)
+	await server.start()
+	# Every download goes to the stand-in server
+	api.URL = server.url
+	aiohttp_client._async_make_resolver = lambda hass: LocalResolver()
+
+	options: Dict[str, Any] = {CONF_INTERPOLATION: arguments.interpolation}
+	if arguments.horizon is not None:
+		options[CONF_FORECAST_HORIZON] = str(arguments.horizon)
+	if arguments.fields is not None:
+		options[CONF_FORECAST_FIELDS] = arguments.fields.split(",")
+
+	config = MappingProxyType({CONF_NAME: "Benchmark", CONF_LATITUDE: 50.08, CONF_LONGITUDE: 14.42})
+
+	results = []
+
+	with tempfile.TemporaryDirectory() as config_dir:
+		hass = HomeAssistant(config_dir)
+		frame.async_setup(hass)
+		hass.config_entries = ConfigEntries(hass, {})
+
+		coordinator = AladinOnlineCoordinator(hass, config, MappingProxyType(options))
+		cache = get_cache(hass)
+		cache_entry = cache._entries[coordinator.cell]
+
+		async def fetch() -> None:
+			cache_entry.data = None
+			cache_entry.fingerprint = None
+			cache_entry.etag = None
+			await cache._async_fetch_once(cache_entry)
+
+		async def revalidate() -> None:
+			await cache._async_fetch_once(cache_entry)
+
+		async def parse() -> None:
+			AladinForecast.from_meteogram(cache_entry.data, coordinator.fields)
+
+		async def update() -> None:
+			coordinator.location._forecast = None
+			coordinator.data = await coordinator.update(fetch=False)
+
+		async def update_cached() -> None:
+			coordinator.data = await coordinator.update(fetch=False)
+
+		# The payload must be cached before the stages that work with it
+		await cache._async_fetch_once(cache_entry)
+		coordinator.location._data = cache_entry.data
+		coordinator.location._data_fingerprint = cache_entry.fingerprint
+		coordinator.data = await coordinator.update(fetch=False)
+
+		weather = WeatherEntity(coordinator, config)
+		sensors = [SensorEntity(coordinator, config, SENSORS[sensor_type]) for sensor_type in SENSORS if SENSORS[sensor_type].field in coordinator.fields]
+
+		async def weather_attributes() -> None:
+			weather._update_attributes()
+
+		async def weather_forecast() -> None:
+			weather._forecast = None
+			weather._build_forecast()
+
+		async def sensor_attributes() -> None:
+			for sensor in sensors:
+				sensor._update_attributes()
+
+		stages: Dict[str, Stage] = {
+			"fetch": fetch,
+			"revalidate": revalidate,
+			"parse": parse,
+			"update": update,
+			"update_cached": update_cached,
+			"weather_attributes": weather_attributes,
+			"weather_forecast": weather_forecast,
+			"sensor_attributes": sensor_attributes,
+		}
+
+		# Stages without the network run many more iterations
+		network_stages = {"fetch", "revalidate"}
+
+		try:
+			for name in arguments.stages:
+				iterations = arguments.iterations if name in network_stages else arguments.iterations * arguments.local_factor
+				results.append(await measure(name, stages[name], iterations, arguments.warmup, arguments.allocation_iterations))
+		finally:
+			coordinator.release()
+			await hass.async_stop(force=True)
+			await server.stop()
+
+	print("fixture={} hours={} requests={} not_modified={} errors={}".format(
+		arguments.fixture,
+		len(payload.get("data", [])),
+		server.requests,
+		server.not_modified,
+		server.errors,
+	))
+
+	return results
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--fixture", default="default", help="synthetic fixture name, recorded fixture name or path to a JSON file")
+	parser.add_argument("--list-fixtures", action="store_true")
+	parser.add_argument("--stages", default=",".join(STAGES), help="comma separated stages, all by default")
+	parser.add_argument("--iterations", type=int, default=50, help="iterations of the network stages")
+	parser.add_argument("--local-factor", type=int, default=10, help="multiplier of the iterations of the stages without the network")
+	parser.add_argument("--warmup", type=int, default=5)
+	parser.add_argument("--allocation-iterations", type=int, default=5, help="iterations traced for allocations, 0 disables tracing")
+	parser.add_argument("--latency", type=float, default=0, help="mean latency of the stand-in server (ms)")
+	parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with 503")
+	parser.add_argument("--horizon", type=int, choices=[0, 12, 24, 48], default=None)
+	parser.add_argument("--fields", default=None, help="comma separated forecast fields, all by default")
+	parser.add_argument("--interpolation", action="store_true")
+	parser.add_argument("--json", dest="json_path", default=None, help="write the results to a JSON file")
+	arguments = parser.parse_args()
+
+	# Fixtures with defects would flood the output with the integration's warnings
+	logging.basicConfig(level=logging.ERROR)
+
+	if arguments.list_fixtures:
+		print("\n".join(available_fixtures()))
+		return
+
+	arguments.stages = [stage for stage in arguments.stages.split(",") if stage]
+	unknown_stages = set(arguments.stages) - set(STAGES)
+	if unknown_stages:
+		parser.error("unknown stages: {}".format(", ".join(sorted(unknown_stages))))
+
+	results = asyncio.run(run(arguments))
+
+	print(format_table(results))
+
+	if arguments.json_path is not None:
+		with open(arguments.json_path, "w") as file:
+			json.dump([result.as_dict() for result in results], file, indent="\t")
+
+
+if __name__ == "__main__":
+	main()
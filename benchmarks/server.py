@@ -0,0 +1,67 @@
+"""Local stand-in for data-provider.chmi.cz."""
+from __future__ import annotations
+from aiohttp import hdrs, web
+import asyncio
+import hashlib
+import json
+import random
+from typing import Any, Dict
+
+
+class AladinStandInServer:
+	"""Serves one meteogram with emulated latency, conditional responses and errors."""
+
+	def __init__(
+		self,
+		payload: Dict[str, Any],
+		latency: float = 0,
+		error_rate: float = 0,
+		support_etag: bool = True,
+		seed: int = 0,
+	) -> None:
+		self.body: bytes = json.dumps(payload).encode()
+		self.etag: str = '"{}"'.format(hashlib.sha1(self.body).hexdigest())
+		self.latency: float = latency
+		self.error_rate: float = error_rate
+		self.support_etag: bool = support_etag
+		self.requests: int = 0
+		self.not_modified: int = 0
+		self.errors: int = 0
+		self._random = random.Random(seed)
+		self._runner: web.AppRunner | None = None
+		self.url: str | None = None
+
+	async def start(self) -> None:
+		app = web.Application()
+		app.router.add_get("/api/graphs/graf.meteogram/", self._handle)
+
+		self._runner = web.AppRunner(app, access_log=None)
+		await self._runner.setup()
+
+		site = web.TCPSite(self._runner, "127.0.0.1", 0)
+		await site.start()
+
+		port = site._server.sockets[0].getsockname()[1]
+		self.url = "http://127.0.0.1:{}/api/graphs/graf.meteogram/?x={{}}&y={{}}".format(port)
+
+	async def stop(self) -> None:
+		if self._runner is not None:
+			await self._runner.cleanup()
+			self._runner = None
+
+	async def _handle(self, request: web.Request) -> web.Response:
+		self.requests += 1
+
+		if self.latency > 0:
+			await asyncio.sleep(self._random.uniform(self.latency / 2, self.latency * 1.5))
+
+		if self._random.random() < self.error_rate:
+			self.errors += 1
+			return web.Response(status=503)
+
+		if self.support_etag and request.headers.get(hdrs.IF_NONE_MATCH) == self.etag:
+			self.not_modified += 1
+			return web.Response(status=304)
+
+		headers = {hdrs.ETAG: self.etag} if self.support_etag else {}
+		return web.Response(body=self.body, content_type="application/json", headers=headers)
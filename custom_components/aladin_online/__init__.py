@@ -1,10 +1,11 @@
-from homeassistant import config_entries, core
+from homeassistant import core
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from typing import Final
-from .aladin_online import AladinOnlineCoordinator
+from .aladin_online import AladinOnlineAreaCoordinator, AladinOnlineBatchCoordinator, AladinOnlineCoordinator
+from .const import CONF_LOCATIONS, CONF_RADIUS
 
-type AladinOnlineConfigEntry = ConfigEntry[AladinOnlineCoordinator]
+type AladinOnlineConfigEntry = ConfigEntry[AladinOnlineCoordinator | AladinOnlineBatchCoordinator | AladinOnlineAreaCoordinator]
 
 PLATFORMS: Final = [
 	Platform.SENSOR,
@@ -13,16 +14,38 @@ PLATFORMS: Final = [
 
 
 async def async_setup_entry(hass: core.HomeAssistant, config_entry: AladinOnlineConfigEntry) -> bool:
-	coordinator = AladinOnlineCoordinator(hass, config_entry.data)
-
-	await coordinator.async_config_entry_first_refresh()
+	if CONF_RADIUS in config_entry.data:
+		coordinator = AladinOnlineAreaCoordinator(hass, config_entry.data, config_entry.options)
+	elif CONF_LOCATIONS in config_entry.data:
+		coordinator = AladinOnlineBatchCoordinator(hass, config_entry.data, config_entry.options)
+	else:
+		coordinator = AladinOnlineCoordinator(hass, config_entry.data, config_entry.options)
+
+	try:
+		# Entities start with the stored meteogram, fresh data is fetched in the slot of the entry
+		if not await coordinator.async_restore():
+			await coordinator.async_config_entry_first_refresh()
+	except Exception:
+		coordinator.release()
+		raise
 
 	config_entry.runtime_data = coordinator
 
+	config_entry.async_on_unload(config_entry.add_update_listener(async_update_options))
+
 	await hass.config_entries.async_forward_entry_setups(config_entry, PLATFORMS)
 
 	return True
 
 
-async def async_unload_entry(hass: core.HomeAssistant, config_entry: config_entries.ConfigEntry) -> bool:
-	return await hass.config_entries.async_unload_platforms(config_entry, PLATFORMS)
+async def async_update_options(hass: core.HomeAssistant, config_entry: AladinOnlineConfigEntry) -> None:
+	await hass.config_entries.async_reload(config_entry.entry_id)
+
+
+async def async_unload_entry(hass: core.HomeAssistant, config_entry: AladinOnlineConfigEntry) -> bool:
+	unloaded = await hass.config_entries.async_unload_platforms(config_entry, PLATFORMS)
+
+	if unloaded:
+		config_entry.runtime_data.release()
+
+	return unloaded
@@ -0,0 +1,163 @@
+from __future__ import annotations
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from homeassistant.components.weather import (
+	ATTR_CONDITION_CLEAR_NIGHT,
+	ATTR_CONDITION_CLOUDY,
+	ATTR_CONDITION_FOG,
+	ATTR_CONDITION_HAIL,
+	ATTR_CONDITION_LIGHTNING_RAINY,
+	ATTR_CONDITION_PARTLYCLOUDY,
+	ATTR_CONDITION_SNOWY,
+	ATTR_CONDITION_SNOWY_RAINY,
+	ATTR_CONDITION_SUNNY,
+	ATTR_CONDITION_RAINY,
+)
+from homeassistant.util import dt
+from typing import Dict, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+	from .forecast import AladinForecast
+
+DAYTIME_START_HOUR = 6
+NIGHTTIME_START_HOUR = 18
+ONE_DAY = timedelta(days=1)
+
+# When several conditions are equally frequent, the more significant one wins
+CONDITION_SIGNIFICANCE: Dict[str, int] = {
+	ATTR_CONDITION_CLEAR_NIGHT: 0,
+	ATTR_CONDITION_SUNNY: 0,
+	ATTR_CONDITION_PARTLYCLOUDY: 1,
+	ATTR_CONDITION_CLOUDY: 2,
+	ATTR_CONDITION_FOG: 3,
+	ATTR_CONDITION_RAINY: 4,
+	ATTR_CONDITION_SNOWY_RAINY: 5,
+	ATTR_CONDITION_SNOWY: 6,
+	ATTR_CONDITION_HAIL: 7,
+	ATTR_CONDITION_LIGHTNING_RAINY: 8,
+}
+
+
+class AladinForecastPeriod:
+
+	__slots__ = (
+		"start",
+		"end",
+		"is_daytime",
+		"temperature",
+		"templow",
+		"precipitation",
+		"wind_speed",
+		"wind_gust_speed",
+		"_conditions",
+	)
+
+	def __init__(self, start: datetime, end: datetime, is_daytime: bool | None = None) -> None:
+		self.start: datetime = start
+		self.end: datetime = end
+		self.is_daytime: bool | None = is_daytime
+		self.temperature: float | None = None
+		self.templow: float | None = None
+		self.precipitation: float | None = None
+		self.wind_speed: float | None = None
+		self.wind_gust_speed: float | None = None
+		self._conditions: Counter = Counter()
+
+	@property
+	def condition(self) -> str | None:
+		if not self._conditions:
+			return None
+
+		condition = max(self._conditions, key=lambda condition: (self._conditions[condition], CONDITION_SIGNIFICANCE.get(condition, 0)))
+
+		# Clear night is not a meaningful summary of a day
+		if condition == ATTR_CONDITION_CLEAR_NIGHT and self.is_daytime is not False:
+			return ATTR_CONDITION_SUNNY
+
+		return condition
+
+	def add(self, condition: str, temperature: float, precipitation: float, wind_speed: float, wind_gust_speed: float) -> None:
+		# NaN fails every comparison, so missing values are skipped
+		if temperature == temperature:
+			if self.temperature is None or temperature > self.temperature:
+				self.temperature = temperature
+			if self.templow is None or temperature < self.templow:
+				self.templow = temperature
+
+		if precipitation == precipitation:
+			self.precipitation = precipitation if self.precipitation is None else self.precipitation + precipitation
+
+		if wind_speed == wind_speed and (self.wind_speed is None or wind_speed > self.wind_speed):
+			self.wind_speed = wind_speed
+
+		if wind_gust_speed == wind_gust_speed and (self.wind_gust_speed is None or wind_gust_speed > self.wind_gust_speed):
+			self.wind_gust_speed = wind_gust_speed
+
+		self._conditions[condition] += 1
+
+
+class AladinForecastAggregates:
+
+	__slots__ = ("daily", "twice_daily")
+
+	def __init__(self, daily: List[AladinForecastPeriod], twice_daily: List[AladinForecastPeriod]) -> None:
+		self.daily: List[AladinForecastPeriod] = daily
+		self.twice_daily: List[AladinForecastPeriod] = twice_daily
+
+
+def aggregate_forecast(forecast: AladinForecast) -> AladinForecastAggregates:
+	daily: List[AladinForecastPeriod] = []
+	twice_daily: List[AladinForecastPeriod] = []
+
+	day: AladinForecastPeriod | None = None
+	half_day: AladinForecastPeriod | None = None
+
+	# Columns of the fields that were not selected aggregate as missing values
+	missing = array("d", [float("nan")]) * len(forecast)
+	temperatures = forecast.temperature if forecast.temperature is not None else missing
+	precipitations = forecast.precipitation if forecast.precipitation is not None else missing
+	wind_speeds = forecast.wind_speed if forecast.wind_speed is not None else missing
+	wind_gust_speeds = forecast.wind_gust_speed if forecast.wind_gust_speed is not None else missing
+
+	# Hours are sorted, so both aggregations are built in one pass over the columns.
+	# Local datetimes share the time zone object, so they are compared by wall time and days stay 24 hours long across DST changes.
+	for i, timestamp in enumerate(forecast.timestamps):
+		local_datetime = dt.as_local(dt.utc_from_timestamp(timestamp))
+
+		if day is None or local_datetime >= day.end:
+			day_start = local_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
+			day = AladinForecastPeriod(day_start, day_start + ONE_DAY)
+			daily.append(day)
+
+		if half_day is None or local_datetime >= half_day.end:
+			half_day = half_day_period(local_datetime)
+			twice_daily.append(half_day)
+
+		condition = forecast.condition(i)
+		temperature = temperatures[i]
+		precipitation = precipitations[i]
+		wind_speed = wind_speeds[i]
+		wind_gust_speed = wind_gust_speeds[i]
+
+		day.add(condition, temperature, precipitation, wind_speed, wind_gust_speed)
+		half_day.add(condition, temperature, precipitation, wind_speed, wind_gust_speed)
+
+	return AladinForecastAggregates(daily, twice_daily)
+
+
+def half_day_period(local_datetime: datetime) -> AladinForecastPeriod:
+	day_start = local_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
+
+	if local_datetime.hour < DAYTIME_START_HOUR:
+		start = (day_start - ONE_DAY).replace(hour=NIGHTTIME_START_HOUR)
+		return AladinForecastPeriod(start, day_start.replace(hour=DAYTIME_START_HOUR), is_daytime=False)
+
+	if local_datetime.hour < NIGHTTIME_START_HOUR:
+		return AladinForecastPeriod(day_start.replace(hour=DAYTIME_START_HOUR), day_start.replace(hour=NIGHTTIME_START_HOUR), is_daytime=True)
+
+	return AladinForecastPeriod(
+		day_start.replace(hour=NIGHTTIME_START_HOUR),
+		(day_start + ONE_DAY).replace(hour=DAYTIME_START_HOUR),
+		is_daytime=False,
+	)
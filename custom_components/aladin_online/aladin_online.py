@@ -1,292 +1,635 @@
-from datetime import timedelta
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timedelta
 from homeassistant import core
-from homeassistant.components.weather import (
-	ATTR_CONDITION_CLEAR_NIGHT,
-	ATTR_CONDITION_CLOUDY,
-	ATTR_CONDITION_FOG,
-	ATTR_CONDITION_HAIL,
-	ATTR_CONDITION_LIGHTNING_RAINY,
-	ATTR_CONDITION_PARTLYCLOUDY,
-	ATTR_CONDITION_SNOWY,
-	ATTR_CONDITION_SNOWY_RAINY,
-	ATTR_CONDITION_SUNNY,
-	ATTR_CONDITION_RAINY,
-)
 from homeassistant.const import (
 	CONF_LATITUDE,
 	CONF_LONGITUDE,
+	CONF_NAME,
 )
-from homeassistant.helpers import aiohttp_client
+from homeassistant.helpers.event import async_track_point_in_utc_time
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from homeassistant.util import dt
-from http import HTTPStatus
-import math
+import struct
+from time import perf_counter
+from .archive import AladinOnlineArchive, get_archive
+from .area import AladinAreaForecast, AladinAreaWeather, area_points
+from .cache import get_cache, CacheKey
+from .changes import AladinForecastChangeThresholds, diff_forecasts
 from .const import (
+	BATCH_STAGGER_WINDOW,
+	BATCH_UPDATE_INTERVAL_MIN,
+	CONF_ARCHIVE,
+	CONF_CHANGE_EVENTS,
+	CONF_CHANGE_PRECIPITATION_ONSET,
+	CONF_CHANGE_TEMPERATURE,
+	CONF_FORECAST_FIELDS,
+	CONF_FORECAST_HORIZON,
+	CONF_INTERPOLATION,
+	CONF_INTERPOLATION_INTERVAL,
+	CONF_LOCATIONS,
+	CONF_RADIUS,
+	DEFAULT_CHANGE_PRECIPITATION_ONSET,
+	DEFAULT_CHANGE_TEMPERATURE,
+	DEFAULT_FORECAST_HORIZON,
+	DEFAULT_INTERPOLATION_INTERVAL,
 	DOMAIN,
+	EVENT_FORECAST_CHANGED,
 	LOGGER,
-	URL,
+	UPDATE_INTERVAL,
+	UPDATE_INTERVAL_MAX,
 )
-from .errors import NoData, ServiceUnavailable
+from .errors import ServiceUnavailable
+from .forecast import AladinForecast, AladinForecastField, AladinWeather
+from .instrumentation import AladinOnlineFetchStats, AladinOnlineUpdateStats
 from types import MappingProxyType
-from typing import Final, List
-
-# Mapping of CHMI numeric weather icons to Home Assistant conditions
-# Icon source: https://www.chmi.cz/predpoved-pocasi/ikony-pocasi
-ICON_CONDITION_MAP = {
-	# Daytime icons
-	10:  ATTR_CONDITION_SUNNY,           # Clear
-	20:  ATTR_CONDITION_SUNNY,           # Mostly clear
-	40:  ATTR_CONDITION_PARTLYCLOUDY,    # Partly cloudy
-	41:  ATTR_CONDITION_RAINY,           # Partly cloudy, shower
-	43:  ATTR_CONDITION_SNOWY_RAINY,     # Partly cloudy, sleet shower
-	45:  ATTR_CONDITION_SNOWY,           # Partly cloudy, snow shower
-	46:  ATTR_CONDITION_LIGHTNING_RAINY, # Partly cloudy, thunderstorm
-	60:  ATTR_CONDITION_PARTLYCLOUDY,    # Cloudy
-	61:  ATTR_CONDITION_RAINY,           # Cloudy, shower
-	62:  ATTR_CONDITION_SNOWY_RAINY,     # Cloudy, freezing rain
-	63:  ATTR_CONDITION_SNOWY_RAINY,     # Cloudy, sleet shower
-	64:  ATTR_CONDITION_SNOWY,           # Cloudy, snowfall
-	65:  ATTR_CONDITION_SNOWY,           # Cloudy, snow shower
-	66:  ATTR_CONDITION_LIGHTNING_RAINY, # Cloudy, thunderstorm
-	69:  ATTR_CONDITION_HAIL,            # Cloudy, hail
-	70:  ATTR_CONDITION_CLOUDY,          # Mostly overcast
-	71:  ATTR_CONDITION_RAINY,           # Mostly overcast, rain or shower
-	72:  ATTR_CONDITION_SNOWY_RAINY,     # Mostly overcast, freezing rain
-	73:  ATTR_CONDITION_SNOWY_RAINY,     # Mostly overcast, sleet
-	74:  ATTR_CONDITION_SNOWY,           # Mostly overcast, snowfall
-	75:  ATTR_CONDITION_SNOWY,           # Mostly overcast, snow shower
-	76:  ATTR_CONDITION_LIGHTNING_RAINY, # Mostly overcast, thunderstorm
-	79:  ATTR_CONDITION_HAIL,            # Mostly overcast, hail
-	80:  ATTR_CONDITION_CLOUDY,          # Overcast
-	81:  ATTR_CONDITION_RAINY,           # Overcast, rain or shower
-	82:  ATTR_CONDITION_SNOWY_RAINY,     # Overcast, freezing rain
-	83:  ATTR_CONDITION_SNOWY_RAINY,     # Overcast, sleet
-	84:  ATTR_CONDITION_SNOWY,           # Overcast, snowfall
-	85:  ATTR_CONDITION_SNOWY,           # Overcast, snow shower
-	86:  ATTR_CONDITION_LIGHTNING_RAINY, # Overcast, thunderstorm
-	89:  ATTR_CONDITION_HAIL,            # Overcast, hail
-	90:  ATTR_CONDITION_FOG,             # Fog
-	91:  ATTR_CONDITION_FOG,             # Fog, shower
-	92:  ATTR_CONDITION_FOG,             # Fog, freezing rain
-	93:  ATTR_CONDITION_FOG,             # Fog, sleet
-	94:  ATTR_CONDITION_FOG,             # Fog, snowfall
-	# Nighttime icons
-	110: ATTR_CONDITION_CLEAR_NIGHT,     # Clear
-	120: ATTR_CONDITION_CLEAR_NIGHT,     # Mostly clear
-	140: ATTR_CONDITION_PARTLYCLOUDY,    # Partly cloudy
-	141: ATTR_CONDITION_RAINY,           # Partly cloudy, shower
-	143: ATTR_CONDITION_SNOWY_RAINY,     # Partly cloudy, sleet shower
-	145: ATTR_CONDITION_SNOWY,           # Partly cloudy, snow shower
-	146: ATTR_CONDITION_LIGHTNING_RAINY, # Partly cloudy, thunderstorm
-	160: ATTR_CONDITION_PARTLYCLOUDY,    # Cloudy
-	161: ATTR_CONDITION_RAINY,           # Cloudy, shower
-	162: ATTR_CONDITION_SNOWY_RAINY,     # Cloudy, freezing rain
-	163: ATTR_CONDITION_SNOWY_RAINY,     # Cloudy, sleet shower
-	164: ATTR_CONDITION_SNOWY,           # Cloudy, snowfall
-	165: ATTR_CONDITION_SNOWY,           # Cloudy, snow shower
-	166: ATTR_CONDITION_LIGHTNING_RAINY, # Cloudy, thunderstorm
-	169: ATTR_CONDITION_HAIL,            # Cloudy, hail
-	170: ATTR_CONDITION_CLOUDY,          # Mostly overcast
-	171: ATTR_CONDITION_RAINY,           # Mostly overcast, rain or shower
-	172: ATTR_CONDITION_SNOWY_RAINY,     # Mostly overcast, freezing rain
-	173: ATTR_CONDITION_SNOWY_RAINY,     # Mostly overcast, sleet
-	174: ATTR_CONDITION_SNOWY,           # Mostly overcast, snowfall
-	175: ATTR_CONDITION_SNOWY,           # Mostly overcast, snow shower
-	176: ATTR_CONDITION_LIGHTNING_RAINY, # Mostly overcast, thunderstorm
-	179: ATTR_CONDITION_HAIL,            # Mostly overcast, hail
-}
-
-
-class AladinActualWeather:
+from typing import Any, Callable, Dict, FrozenSet, List, Tuple
 
-	def __init__(
-		self,
-		condition: str,
-		temperature: float,
-		apparent_temperature: float,
-		precipitation: float,
-		pressure: float,
-		humidity: float,
-		clouds: float,
-		wind_speed: float,
-		wind_bearing: float,
-		wind_gust_speed: float,
-		wind_gust_bearing: float,
-		snow_precipitation: float,
-	) -> None:
-		self.condition = condition
-		self.temperature = temperature
-		self.apparent_temperature = apparent_temperature
-		self.precipitation = precipitation
-		self.pressure = pressure
-		self.humidity = humidity
-		self.clouds = clouds
-		self.wind_speed = wind_speed
-		self.wind_bearing = wind_bearing
-		self.wind_gust_speed = wind_gust_speed
-		self.wind_gust_bearing = wind_gust_bearing
-		self.snow_precipitation = snow_precipitation
-
-
-class AladinWeatherForecast:
+
+class AladinOnlineLocation:
+	"""Forecast of one place, parsed from the meteogram shared by the entries at the same coordinates."""
 
 	def __init__(
 		self,
-		forecast_datetime: dt.datetime,
-		condition: str,
-		temperature: float,
-		apparent_temperature: float,
-		precipitation: float,
-		pressure: float,
-		wind_speed: float,
-		wind_bearing: float,
-		wind_gust_speed: float,
-		humidity: float,
-		clouds: float,
+		hass: core.HomeAssistant,
+		latitude: float,
+		longitude: float,
+		options: MappingProxyType,
+		on_cache_update: Callable[[], None],
 	) -> None:
-		self.datetime = forecast_datetime
-		self.condition = condition
-		self.temperature = temperature
-		self.apparent_temperature = apparent_temperature
-		self.precipitation = precipitation
-		self.pressure = pressure
-		self.wind_speed = wind_speed
-		self.wind_bearing = wind_bearing
-		self.wind_gust_speed = wind_gust_speed
-		self.humidity = humidity
-		self.clouds = clouds
-
-
-class AladinWeather:
-
-	def __init__(self, actual_weather: AladinActualWeather) -> None:
-		self.actual_weather: AladinActualWeather = actual_weather
-		self.hourly_forecasts: List[AladinWeatherForecast] = []
-
-	def add_hourly_forecast(self, forecast: AladinWeatherForecast) -> None:
-		self.hourly_forecasts.append(forecast)
-
+		self._hass: core.HomeAssistant = hass
+		self._interpolation_interval: timedelta | None = None
+		if options.get(CONF_INTERPOLATION, False):
+			self._interpolation_interval = timedelta(minutes=options.get(CONF_INTERPOLATION_INTERVAL, DEFAULT_INTERPOLATION_INTERVAL))
+		horizon_hours = int(options.get(CONF_FORECAST_HORIZON, DEFAULT_FORECAST_HORIZON))
+		self._horizon: timedelta | None = timedelta(hours=horizon_hours) if horizon_hours > 0 else None
+		self.fields: FrozenSet[AladinForecastField] = frozenset(
+			AladinForecastField(field) for field in options.get(CONF_FORECAST_FIELDS, list(AladinForecastField))
+		)
+		self._data = None
+		self._data_fingerprint: str | None = None
+		self._forecast: AladinForecast | None = None
+		self._forecast_fingerprint: str | None = None
+		self._on_cache_update: Callable[[], None] = on_cache_update
+		self.weather: AladinWeather | None = None
+		self.stats: AladinOnlineUpdateStats = AladinOnlineUpdateStats()
+
+		self.cell: CacheKey = get_cache(hass).acquire(latitude, longitude, self._horizon)
+		self._unsub_cache_listener: Callable[[], None] = get_cache(hass).async_add_listener(self.cell, self._handle_cache_update)
+
+		self.archive: AladinOnlineArchive | None = None
+		if options.get(CONF_ARCHIVE, False):
+			self.archive = get_archive(hass, self.cell)
+
+		self._change_thresholds: AladinForecastChangeThresholds | None = None
+		if options.get(CONF_CHANGE_EVENTS, False):
+			self._change_thresholds = AladinForecastChangeThresholds(
+				options.get(CONF_CHANGE_TEMPERATURE, DEFAULT_CHANGE_TEMPERATURE),
+				timedelta(hours=options.get(CONF_CHANGE_PRECIPITATION_ONSET, DEFAULT_CHANGE_PRECIPITATION_ONSET)),
+			)
+		# Changes of the forecast brought by the last update, beyond the thresholds
+		self.changes: Dict[str, Any] = {}
 
-class AladinOnlineCoordinator(DataUpdateCoordinator):
+	@property
+	def data_age(self) -> timedelta | None:
+		return get_cache(self._hass).get_data_age(self.cell)
 
-	def __init__(self, hass: core.HomeAssistant, config: MappingProxyType) -> None:
-		super().__init__(hass, LOGGER, name=DOMAIN, update_interval=timedelta(minutes=30), update_method=self.update)
+	@property
+	def data_checked(self) -> datetime | None:
+		return get_cache(self._hass).get_data_checked(self.cell)
 
-		self._config: MappingProxyType = config
-		self._data = None
+	@property
+	def fetch_stats(self) -> AladinOnlineFetchStats:
+		return get_cache(self._hass).get_fetch_stats(self.cell)
 
-	async def update(self) -> AladinWeather:
-		if self._should_update_data():
+	async def async_update(self, fetch: bool = True) -> AladinWeather:
+		if fetch:
 			try:
 				await self._update_data()
 			except Exception as ex:
-				if self._data is None:
+				# Too old data makes the entities unavailable
+				if self._data is None or get_cache(self._hass).is_expired(self.cell):
 					raise ex
 
 		if self._data is None:
 			raise ServiceUnavailable
 
-		entries = self._data.get("data", [])
-		if not entries:
-			raise NoData
+		update_start = perf_counter()
+		parsed = False
+		previous_forecast = self._forecast
+		self.changes = {}
+
+		# The meteogram is parsed only once per model run
+		if self._forecast is None or self._forecast_fingerprint != self._data_fingerprint or self._data_fingerprint is None:
+			horizon_end = dt.utcnow() + self._horizon if self._horizon is not None else None
+			fingerprint = self._data_fingerprint
+			# Parsing, the derived quantities and the aggregates run in the executor, off the event loop
+			self._forecast = await self._hass.async_add_executor_job(
+				AladinForecast.from_meteogram,
+				self._data,
+				self.fields,
+				horizon_end,
+			)
+			self._forecast_fingerprint = fingerprint
+			self.stats.parse.record(perf_counter() - update_start)
+			parsed = True
+		else:
+			self.stats.parse_skipped += 1
+
+		# The first forecast after a start has nothing to be compared with
+		if parsed and previous_forecast is not None and self._change_thresholds is not None:
+			self.changes = await self._hass.async_add_executor_job(
+				diff_forecasts,
+				previous_forecast,
+				self._forecast,
+				self._change_thresholds,
+				dt.utcnow(),
+			)
+
+		weather = self.select_actual_weather()
+
+		self.stats.update.record(perf_counter() - update_start)
+
+		# Every model run is archived once, the archive ignores the hours it already has
+		if parsed and self.archive is not None:
+			await self._async_archive(self._data)
+
+		return weather
+
+	@core.callback
+	def restore(self) -> bool:
+		cache = get_cache(self._hass)
+
+		data = cache.get_cached_data(self.cell)
+		# Too old data waits for the first refresh, the entities would be unavailable anyway
+		if data is None or cache.is_expired(self.cell):
+			return False
+
+		entries = data.get("data", [])
+		if not entries or dt.parse_datetime(entries[-1]["validityTime"]) <= dt.utcnow():
+			return False
+
+		self._data = data
+		self._data_fingerprint = cache.get_fingerprint(self.cell)
+
+		return True
+
+	@core.callback
+	def release(self) -> None:
+		self._unsub_cache_listener()
+		get_cache(self._hass).release(self.cell, self._horizon)
+
+	@core.callback
+	def select_actual_weather(self) -> AladinWeather | None:
+		if self._forecast is None:
+			return self.weather
 
 		now = dt.utcnow()
+		actual_index = self._forecast.index_at(now)
 
-		# Find the current hour in the data
-		actual_entry = None
-		actual_index = 0
-		for i, entry in enumerate(entries):
-			entry_time = dt.parse_datetime(entry["validityTime"])
-			if entry_time <= now:
-				actual_entry = entry
-				actual_index = i
-			else:
-				break
-
-		if actual_entry is None:
-			actual_entry = entries[0]
-			actual_index = 0
-
-		actual_weather = AladinActualWeather(
-			condition=AladinOnlineCoordinator._format_condition(actual_entry.get("icon", 0)),
-			temperature=actual_entry.get("t2m"),
-			apparent_temperature=AladinOnlineCoordinator._compute_apparent_temperature(
-				actual_entry.get("t2m"),
-				actual_entry.get("rh2m"),
-				actual_entry.get("windSpeed"),
-			),
-			precipitation=actual_entry.get("prec", 0),
-			pressure=actual_entry.get("mslp"),
-			humidity=actual_entry.get("rh2m"),
-			clouds=actual_entry.get("cloudsTot"),
-			wind_speed=actual_entry.get("windSpeed", 0),
-			wind_bearing=AladinOnlineCoordinator._format_wind_direction(actual_entry.get("windDirection", 0)),
-			wind_gust_speed=actual_entry.get("windGustSpeed", 0),
-			wind_gust_bearing=AladinOnlineCoordinator._format_wind_direction(actual_entry.get("windDirection", 0)),
-			snow_precipitation=actual_entry.get("snow", 0),
+		if self._interpolation_interval is not None:
+			self.weather = AladinWeather(self._forecast, actual_index, self._forecast.interpolated_weather(now))
+
+		# Nothing changed since the last update
+		elif self.weather is None or self.weather.forecast is not self._forecast or self.weather.actual_index != actual_index:
+			self.weather = AladinWeather(self._forecast, actual_index)
+
+		return self.weather
+
+	@core.callback
+	def next_network_refresh(self, offset: timedelta = timedelta()) -> timedelta:
+		next_update = get_cache(self._hass).get_next_update(self.cell)
+		if next_update is None:
+			return UPDATE_INTERVAL + offset
+
+		# The offset comes after the expected publication of the model run, the refreshes of the entries do not coincide
+		return min(max(next_update - dt.utcnow(), UPDATE_INTERVAL), UPDATE_INTERVAL_MAX) + offset
+
+	@core.callback
+	def refresh_due(self) -> bool:
+		return get_cache(self._hass).is_due(self.cell)
+
+	@core.callback
+	def next_actual_weather_update(self) -> datetime | None:
+		if self.weather is None:
+			return None
+
+		next_index = self.weather.actual_index + 1
+		if next_index >= len(self.weather.forecast):
+			return None
+
+		# The current weather moves on from the cached forecast, without the network
+		next_update = dt.utc_from_timestamp(self.weather.forecast.timestamps[next_index])
+
+		if self._interpolation_interval is not None:
+			now = dt.utcnow()
+			interpolation_update = now + self._interpolation_interval - (now - dt.start_of_local_day(now)) % self._interpolation_interval
+			next_update = min(next_update, interpolation_update)
+
+		return next_update
+
+	async def _async_archive(self, data: Dict[str, Any]) -> None:
+		try:
+			await self.archive.async_append(data)
+		except (OSError, ValueError, struct.error) as ex:
+			# The archive is optional, the forecast is served without it
+			LOGGER.warning("Archiving the meteogram for %s failed: %s", self.cell, repr(ex))
+
+	async def _update_data(self) -> None:
+		cache = get_cache(self._hass)
+		self._data = await cache.async_get_data(self.cell)
+		self._data_fingerprint = cache.get_fingerprint(self.cell)
+
+	@core.callback
+	def _handle_cache_update(self) -> None:
+		# A background download brought a new meteogram, the refresh takes it from the cache without the network
+		if get_cache(self._hass).get_fingerprint(self.cell) != self._data_fingerprint:
+			self._on_cache_update()
+
+
+class AladinOnlineCoordinator(DataUpdateCoordinator):
+
+	def __init__(self, hass: core.HomeAssistant, config: MappingProxyType, options: MappingProxyType) -> None:
+		super().__init__(hass, LOGGER, name=DOMAIN, update_interval=UPDATE_INTERVAL, update_method=self.update)
+
+		self._config: MappingProxyType = config
+		self._unsub_actual_weather_update: Callable[[], None] | None = None
+		self._refresh_offset: timedelta = get_cache(hass).get_refresh_offset(config[CONF_NAME])
+
+		self.location: AladinOnlineLocation = AladinOnlineLocation(
+			hass,
+			self._config.get(CONF_LATITUDE, self.hass.config.latitude),
+			self._config.get(CONF_LONGITUDE, self.hass.config.longitude),
+			options,
+			self._handle_cache_update,
 		)
 
-		weather = AladinWeather(actual_weather)
-
-		for entry in entries[actual_index + 1:]:
-			forecast_datetime = dt.parse_datetime(entry["validityTime"])
-
-			forecast = AladinWeatherForecast(
-				forecast_datetime=forecast_datetime,
-				condition=AladinOnlineCoordinator._format_condition(entry.get("icon", 0)),
-				temperature=entry.get("t2m"),
-				apparent_temperature=AladinOnlineCoordinator._compute_apparent_temperature(
-					entry.get("t2m"),
-					entry.get("rh2m"),
-					entry.get("windSpeed"),
-				),
-				precipitation=entry.get("prec", 0),
-				pressure=entry.get("mslp"),
-				wind_speed=entry.get("windSpeed", 0),
-				wind_bearing=AladinOnlineCoordinator._format_wind_direction(entry.get("windDirection", 0)),
-				wind_gust_speed=entry.get("windGustSpeed", 0),
-				humidity=entry.get("rh2m"),
-				clouds=entry.get("cloudsTot"),
-			)
-			weather.add_hourly_forecast(forecast)
+	@property
+	def cell(self) -> CacheKey:
+		return self.location.cell
+
+	@property
+	def data_age(self) -> timedelta | None:
+		return self.location.data_age
+
+	@property
+	def data_checked(self) -> datetime | None:
+		return self.location.data_checked
+
+	@property
+	def fetch_stats(self) -> AladinOnlineFetchStats:
+		return self.location.fetch_stats
+
+	@property
+	def fields(self) -> FrozenSet[AladinForecastField]:
+		return self.location.fields
+
+	@property
+	def stats(self) -> AladinOnlineUpdateStats:
+		return self.location.stats
+
+	@core.callback
+	def get_location(self, key: str | None = None) -> AladinOnlineLocation:
+		return self.location
+
+	async def update(self, fetch: bool = True) -> AladinWeather:
+		weather = await self.location.async_update(fetch)
+
+		if self.location.changes:
+			self.hass.bus.async_fire(EVENT_FORECAST_CHANGED, {
+				CONF_NAME: self._config[CONF_NAME],
+				**self.location.changes,
+			})
+
+		self.update_interval = self.location.next_network_refresh(self._refresh_offset)
+		self._schedule_actual_weather_update()
 
 		return weather
 
-	def _should_update_data(self) -> bool:
+	async def async_restore(self) -> bool:
+		await get_cache(self.hass).async_load()
+
+		if not self.location.restore():
+			return False
+
+		weather = await self.update(fetch=False)
+
+		# Entries with outdated data refresh in their own slot, not all at once after a restart
+		if self.location.refresh_due():
+			self.update_interval = self._refresh_offset
+
+		self.async_set_updated_data(weather)
+
 		return True
 
-	async def _update_data(self) -> None:
-		session = aiohttp_client.async_get_clientsession(self.hass)
-		latitude = self._config.get(CONF_LATITUDE, self.hass.config.latitude)
-		longitude = self._config.get(CONF_LONGITUDE, self.hass.config.longitude)
-		response = await session.get(URL.format(longitude, latitude))
+	@core.callback
+	def async_update_listeners(self) -> None:
+		publish_start = perf_counter()
+		super().async_update_listeners()
+		self.location.stats.publish.record(perf_counter() - publish_start)
+
+	@core.callback
+	def release(self) -> None:
+		self._cancel_actual_weather_update()
+		self.location.release()
+
+	@core.callback
+	def _handle_cache_update(self) -> None:
+		self.hass.async_create_task(self.async_refresh())
+
+	@core.callback
+	def _schedule_actual_weather_update(self) -> None:
+		self._cancel_actual_weather_update()
+
+		next_update = self.location.next_actual_weather_update()
+		if next_update is None:
+			return
+
+		self._unsub_actual_weather_update = async_track_point_in_utc_time(
+			self.hass,
+			self._handle_actual_weather_update,
+			next_update,
+		)
+
+	@core.callback
+	def _cancel_actual_weather_update(self) -> None:
+		if self._unsub_actual_weather_update is not None:
+			self._unsub_actual_weather_update()
+			self._unsub_actual_weather_update = None
+
+	@core.callback
+	def _handle_actual_weather_update(self, _now: datetime) -> None:
+		self._unsub_actual_weather_update = None
+
+		weather = self.location.select_actual_weather()
+		if weather is None:
+			return
+
+		self._schedule_actual_weather_update()
+
+		if weather is not self.data:
+			# The network refresh keeps its own schedule
+			self.data = weather
+			self.async_update_listeners()
+
+
+class AladinOnlineBatchCoordinator(DataUpdateCoordinator):
+	"""Many named locations of one config entry under one update schedule."""
+
+	_stagger_window: timedelta = BATCH_STAGGER_WINDOW
+
+	def __init__(self, hass: core.HomeAssistant, config: MappingProxyType, options: MappingProxyType) -> None:
+		super().__init__(hass, LOGGER, name=DOMAIN, update_interval=UPDATE_INTERVAL, update_method=self.update)
 
-		if response.status != HTTPStatus.OK:
+		self._config: MappingProxyType = config
+		self._unsub_actual_weather_update: Callable[[], None] | None = None
+
+		self._locations: Dict[str, AladinOnlineLocation] = {}
+		for name, latitude, longitude in self._location_points(config):
+			self._locations[name] = AladinOnlineLocation(
+				hass,
+				latitude,
+				longitude,
+				self._location_options(options),
+				lambda name=name: self._handle_cache_update(name),
+			)
+
+		# Locations refresh in a fixed order spread over the stagger window, after the slot of the entry
+		refresh_offset = get_cache(hass).get_refresh_offset(config[CONF_NAME])
+		self._stagger: Dict[str, timedelta] = {
+			name: refresh_offset + self._stagger_window * index / len(self._locations)
+			for index, name in enumerate(self._locations)
+		}
+		self._next_refresh: Dict[str, datetime] = {}
+
+	@property
+	def fields(self) -> FrozenSet[AladinForecastField]:
+		# All locations share the options of the entry
+		return next(iter(self._locations.values())).fields
+
+	@property
+	def location_names(self) -> List[str]:
+		return list(self._locations)
+
+	@core.callback
+	def get_location(self, key: str | None = None) -> AladinOnlineLocation:
+		return self._locations[key]
+
+	def _location_points(self, config: MappingProxyType) -> List[Tuple[str, float, float]]:
+		return [
+			(location_config[CONF_NAME], location_config[CONF_LATITUDE], location_config[CONF_LONGITUDE])
+			for location_config in config[CONF_LOCATIONS]
+		]
+
+	def _location_options(self, options: MappingProxyType) -> MappingProxyType:
+		return options
+
+	@core.callback
+	def _build_data(self) -> Any:
+		return {name: location.weather for name, location in self._locations.items() if location.weather is not None}
+
+	async def _async_build_data(self) -> Any:
+		return self._build_data()
+
+	async def update(self, fetch: bool = True) -> Dict[str, AladinWeather]:
+		now = dt.utcnow()
+
+		due = [
+			name for name, location in self._locations.items()
+			if fetch and (location.weather is None or self._next_refresh.get(name, now) <= now)
+		]
+
+		# Downloads run concurrently, the shared cache bounds how many at a time
+		results = await asyncio.gather(*(self._locations[name].async_update() for name in due), return_exceptions=True)
+
+		for name, result in zip(due, results):
+			location = self._locations[name]
+			self._next_refresh[name] = now + location.next_network_refresh(self._stagger[name])
+
+			if isinstance(result, Exception):
+				LOGGER.debug("Update of %s failed: %s", name, repr(result))
+				# The last forecast is kept unless its data is too old
+				if get_cache(self.hass).is_expired(location.cell):
+					location.weather = None
+			elif location.changes:
+				self.hass.bus.async_fire(EVENT_FORECAST_CHANGED, {
+					CONF_NAME: self._config[CONF_NAME],
+					"location": name,
+					**location.changes,
+				})
+
+		for name, location in self._locations.items():
+			if name not in due:
+				location.select_actual_weather()
+
+		if all(location.weather is None for location in self._locations.values()):
 			raise ServiceUnavailable
 
-		self._data = await response.json(content_type=None)
-
-	@staticmethod
-	def _format_condition(icon: int) -> str:
-		if icon in ICON_CONDITION_MAP:
-			return ICON_CONDITION_MAP[icon]
-		LOGGER.warning("Unknown weather icon: {}".format(icon))
-		return ATTR_CONDITION_SUNNY
-
-	@staticmethod
-	def _format_wind_direction(raw: float) -> float:
-		return raw % 360
-
-	@staticmethod
-	def _compute_apparent_temperature(temperature: float, humidity: float, wind_speed: float) -> float:
-		# Australian apparent temperature formula (Steadman / Bureau of Meteorology).
-		# The data source does not provide apparent temperature, so we derive it
-		# from temperature (°C), relative humidity (%) and wind speed (m/s).
-		# AT = T + 0.33·e − 0.70·ws − 4.00
-		# e  = (rh / 100) · 6.105 · exp(17.27·T / (237.7 + T))   (water vapour pressure in hPa)
-		if temperature is None or humidity is None or wind_speed is None:
+		self._schedule_network_refresh()
+		self._schedule_actual_weather_update()
+
+		return await self._async_build_data()
+
+	async def async_restore(self) -> bool:
+		await get_cache(self.hass).async_load()
+
+		restored = [name for name, location in self._locations.items() if location.restore()]
+		if not restored:
+			return False
+
+		now = dt.utcnow()
+
+		for name, location in self._locations.items():
+			if name not in restored:
+				self._next_refresh[name] = now
+				continue
+
+			await location.async_update(fetch=False)
+
+			# Locations with outdated data refresh in their own slot, not all at once after a restart
+			if location.refresh_due():
+				self._next_refresh[name] = now + self._stagger[name]
+			else:
+				self._next_refresh[name] = now + location.next_network_refresh(self._stagger[name])
+
+		self._schedule_network_refresh()
+		self._schedule_actual_weather_update()
+
+		self.async_set_updated_data(await self._async_build_data())
+
+		return True
+
+	@core.callback
+	def async_update_listeners(self) -> None:
+		publish_start = perf_counter()
+		super().async_update_listeners()
+		publish_time = perf_counter() - publish_start
+
+		for location in self._locations.values():
+			location.stats.publish.record(publish_time)
+
+	@core.callback
+	def release(self) -> None:
+		self._cancel_actual_weather_update()
+
+		for location in self._locations.values():
+			location.release()
+
+	@core.callback
+	def _handle_cache_update(self, name: str) -> None:
+		# The location takes the new meteogram from the cache on the next refresh, requests are debounced
+		self._next_refresh.pop(name, None)
+		self.hass.async_create_task(self.async_request_refresh())
+
+	@core.callback
+	def _schedule_network_refresh(self) -> None:
+		if not self._next_refresh:
+			self.update_interval = UPDATE_INTERVAL
+			return
+
+		self.update_interval = max(min(self._next_refresh.values()) - dt.utcnow(), BATCH_UPDATE_INTERVAL_MIN)
+
+	@core.callback
+	def _schedule_actual_weather_update(self) -> None:
+		self._cancel_actual_weather_update()
+
+		next_updates = [
+			next_update for next_update in (location.next_actual_weather_update() for location in self._locations.values())
+			if next_update is not None
+		]
+		if not next_updates:
+			return
+
+		# One timer serves all locations, the hours of the forecasts are the same
+		self._unsub_actual_weather_update = async_track_point_in_utc_time(
+			self.hass,
+			self._handle_actual_weather_update,
+			min(next_updates),
+		)
+
+	@core.callback
+	def _cancel_actual_weather_update(self) -> None:
+		if self._unsub_actual_weather_update is not None:
+			self._unsub_actual_weather_update()
+			self._unsub_actual_weather_update = None
+
+	@core.callback
+	def _handle_actual_weather_update(self, _now: datetime) -> None:
+		self._unsub_actual_weather_update = None
+
+		if self.data is None:
+			return
+
+		changed = False
+		for location in self._locations.values():
+			weather = location.weather
+			if location.select_actual_weather() is not weather:
+				changed = True
+
+		self._schedule_actual_weather_update()
+
+		if changed:
+			# The network refresh keeps its own schedule
+			self.data = self._build_data()
+			self.async_update_listeners()
+
+
+class AladinOnlineAreaCoordinator(AladinOnlineBatchCoordinator):
+	"""Regional aggregates over a grid of points around a center, the points are locations of a batch."""
+
+	# Points of an area refresh together, the aggregates should not mix model runs
+	_stagger_window: timedelta = timedelta()
+
+	def __init__(self, hass: core.HomeAssistant, config: MappingProxyType, options: MappingProxyType) -> None:
+		self._area_forecast: AladinAreaForecast | None = None
+		self._area_forecasts: Tuple[AladinForecast, ...] = ()
+
+		super().__init__(hass, config, options)
+
+	@property
+	def points(self) -> int:
+		return len(self._locations)
+
+	def _location_points(self, config: MappingProxyType) -> List[Tuple[str, float, float]]:
+		# Points are named by their order, the center first, so the coordinates stay out of the names
+		return [
+			(str(index), latitude, longitude)
+			for index, (latitude, longitude) in enumerate(area_points(config[CONF_LATITUDE], config[CONF_LONGITUDE], config[CONF_RADIUS]))
+		]
+
+	def _location_options(self, options: MappingProxyType) -> MappingProxyType:
+		# The aggregates need the precipitation, the gusts and the icons only
+		return MappingProxyType({
+			CONF_FORECAST_FIELDS: [AladinForecastField.PRECIPITATION, AladinForecastField.WIND],
+			CONF_FORECAST_HORIZON: options.get(CONF_FORECAST_HORIZON, DEFAULT_FORECAST_HORIZON),
+		})
+
+	async def async_restore(self) -> bool:
+		await get_cache(self.hass).async_load()
+
+		# Aggregates of a part of the area would understate it, a new area waits for the first refresh of all points
+		if any(get_cache(self.hass).is_expired(location.cell) for location in self._locations.values()):
+			return False
+
+		return await super().async_restore()
+
+	@core.callback
+	def _build_data(self) -> AladinAreaWeather | None:
+		if self._area_forecast is None or len(self._area_forecast) == 0:
 			return None
 
-		vapour_pressure = (humidity / 100) * 6.105 * math.exp(17.27 * temperature / (237.7 + temperature))
+		return AladinAreaWeather(self._area_forecast, self._area_forecast.index_at(dt.utcnow()))
+
+	async def _async_build_data(self) -> AladinAreaWeather | None:
+		forecasts = tuple(location.weather.forecast for location in self._locations.values() if location.weather is not None)
+
+		# The points are aggregated again only when one of them has a new forecast, in the executor
+		if (
+			self._area_forecast is None
+			or len(forecasts) != len(self._area_forecasts)
+			or any(forecast is not previous for forecast, previous in zip(forecasts, self._area_forecasts))
+		):
+			self._area_forecast = await self.hass.async_add_executor_job(AladinAreaForecast.from_forecasts, forecasts)
+			self._area_forecasts = forecasts
 
-		return temperature + 0.33 * vapour_pressure - 0.70 * wind_speed - 4.00
+		return self._build_data()
@@ -0,0 +1,273 @@
+from __future__ import annotations
+from aiohttp import ClientSession, ClientTimeout, hdrs
+import asyncio
+import codecs
+from datetime import datetime
+import hashlib
+from homeassistant.util import dt
+from http import HTTPStatus
+import json
+import re
+from time import perf_counter
+from .const import URL
+from .errors import LocationUnavailable, ServiceUnavailable
+from typing import Any, Callable, Dict, List
+
+READ_CHUNK_SIZE = 16 * 1024
+
+# Key of the array of hourly entries in the top-level object, the rest of the meteogram is not used
+DATA_KEY = '"data"'
+WHITESPACE = re.compile(r"[\s,]*")
+# Before the hourly entries only strings and nesting matter, other values are skipped
+SIGNIFICANT = re.compile(r"\S")
+STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class AladinOnlineResponse:
+	"""Meteogram download, data is None when the server confirmed the cached one."""
+
+	__slots__ = ("data", "fingerprint", "etag", "last_modified", "size", "decode_time")
+
+	def __init__(
+		self,
+		data: Dict[str, Any] | None,
+		fingerprint: str | None = None,
+		etag: str | None = None,
+		last_modified: str | None = None,
+		size: int = 0,
+		decode_time: float = 0,
+	) -> None:
+		self.data: Dict[str, Any] | None = data
+		self.fingerprint: str | None = fingerprint
+		self.etag: str | None = etag
+		self.last_modified: str | None = last_modified
+		self.size: int = size
+		self.decode_time: float = decode_time
+
+
+class AladinMeteogramDecoder:
+	"""Incremental decoder of the hourly entries, fed with the body as it arrives."""
+
+	def __init__(self, horizon: datetime | None = None) -> None:
+		self.entries: List[Dict[str, Any]] = []
+		self.done: bool = False
+		self.decode_time: float = 0
+		self._horizon: datetime | None = horizon
+		self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+		self._json_decoder = json.JSONDecoder()
+		self._buffer: str = ""
+		self._position: int | None = None
+		# State of the scan for the top-level key of the hourly entries, kept between the chunks
+		self._scan_position: int = 0
+		self._depth: int = 0
+		self._string_start: int | None = None
+		self._key_state: int = 0
+		# Entries are fingerprinted by their source, so a cut at the horizon does not depend on chunk boundaries
+		self._hash = hashlib.sha1()
+
+	@property
+	def fingerprint(self) -> str:
+		return self._hash.hexdigest()
+
+	@property
+	def empty(self) -> bool:
+		return self._position is None and self._buffer.strip() == ""
+
+	def feed(self, chunk: bytes) -> None:
+		if self.done:
+			return
+
+		decode_start = perf_counter()
+		self._feed(chunk)
+		self.decode_time += perf_counter() - decode_start
+
+	def _feed(self, chunk: bytes) -> None:
+		self._buffer += self._text_decoder.decode(chunk)
+
+		if self._position is None:
+			self._position = self._find_data_array()
+			if self._position is None:
+				return
+
+		buffer = self._buffer
+		position = self._position
+
+		while True:
+			position = WHITESPACE.match(buffer, position).end()
+			if position == len(buffer):
+				break
+
+			if buffer[position] == "]":
+				self.done = True
+				break
+
+			try:
+				entry, end = self._json_decoder.raw_decode(buffer, position)
+			except ValueError:
+				# The entry is not complete yet
+				break
+
+			# Hours are keyed by their validity time, a meteogram with an entry without it is not usable
+			validity_time = entry.get("validityTime") if isinstance(entry, dict) else None
+			validity = dt.parse_datetime(validity_time) if isinstance(validity_time, str) else None
+			if validity is None:
+				raise ValueError("Invalid meteogram entry: {}".format(buffer[position:end][:100]))
+
+			if self._horizon is not None and validity > self._horizon:
+				self.done = True
+				break
+
+			self._hash.update(buffer[position:end].encode())
+			self.entries.append(entry)
+			position = end
+
+		# Decoded entries are dropped from the buffer
+		self._buffer = buffer[position:]
+		self._position = 0
+
+	def finish(self) -> Dict[str, Any]:
+		self._buffer += self._text_decoder.decode(b"", final=True)
+
+		# A meteogram without hourly entries must not replace the cached one
+		if self._position is None:
+			raise LocationUnavailable
+
+		if not self.done:
+			raise ValueError("Meteogram is incomplete")
+
+		if not self.entries:
+			raise LocationUnavailable
+
+		return {"data": self.entries}
+
+	def _find_data_array(self) -> int | None:
+		"""Position after the opening bracket of the "data" array of the top-level object, None until it arrives.
+
+		Keys of the same name in nested objects are skipped.
+		"""
+		buffer = self._buffer
+		position = self._scan_position
+
+		while True:
+			if self._string_start is not None:
+				match = STRING_SPECIAL.search(buffer, position)
+				if match is None or (match.group() == "\\" and match.end() == len(buffer)):
+					# The string continues in the next chunk, an escape is resolved with its character
+					self._scan_position = position if match is None else match.start()
+					return None
+
+				if match.group() == "\\":
+					position = match.end() + 1
+					continue
+
+				position = match.end()
+				# A string directly in the top-level object, "data" followed by a colon and an array
+				if self._depth == 1 and buffer[self._string_start:position] == DATA_KEY:
+					self._key_state = 1
+				self._string_start = None
+				continue
+
+			match = SIGNIFICANT.search(buffer, position)
+			if match is None:
+				self._scan_position = len(buffer)
+				return None
+
+			character = match.group()
+			position = match.end()
+
+			if self._key_state == 1 and character == ":":
+				self._key_state = 2
+				continue
+			if self._key_state == 2 and character == "[":
+				return position
+			self._key_state = 0
+
+			if character == '"':
+				self._string_start = match.start()
+			elif character in "{[":
+				self._depth += 1
+			elif character in "}]":
+				self._depth -= 1
+
+
+async def async_get_meteogram(
+	session: ClientSession,
+	latitude: float,
+	longitude: float,
+	timeout: ClientTimeout,
+	max_size: int,
+	horizon: datetime | None = None,
+	etag: str | None = None,
+	last_modified: str | None = None,
+	on_entries: Callable[[], None] | None = None,
+) -> AladinOnlineResponse:
+	"""Download the meteogram, decoding the hourly entries while they arrive and stopping at the horizon.
+
+	on_entries is called once the first hourly entry is decoded, before the rest of the body arrives.
+	"""
+	headers = {}
+	if etag is not None:
+		headers[hdrs.IF_NONE_MATCH] = etag
+	if last_modified is not None:
+		headers[hdrs.IF_MODIFIED_SINCE] = last_modified
+
+	async with session.get(URL.format(longitude, latitude), headers=headers, timeout=timeout) as response:
+		if response.status == HTTPStatus.NOT_MODIFIED and headers:
+			return AladinOnlineResponse(None)
+
+		if response.status != HTTPStatus.OK:
+			raise ServiceUnavailable
+
+		content_length = response.headers.get(hdrs.CONTENT_LENGTH)
+		if content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+			raise ServiceUnavailable
+
+		loop = asyncio.get_running_loop()
+		decoder = AladinMeteogramDecoder(horizon)
+		size = 0
+		pending = bytearray()
+		feeding: asyncio.Future | None = None
+
+		async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+			size += len(chunk)
+			if size > max_size:
+				raise ServiceUnavailable
+
+			pending += chunk
+
+			# Decoding runs in the executor one job at a time, chunks arriving meanwhile go to the next job together
+			if feeding is not None and not feeding.done():
+				continue
+
+			if feeding is not None:
+				feeding.result()
+
+				if on_entries is not None and decoder.entries:
+					on_entries()
+					on_entries = None
+
+				if decoder.done:
+					break
+
+			feeding = loop.run_in_executor(None, decoder.feed, bytes(pending))
+			pending.clear()
+
+		if feeding is not None:
+			await feeding
+		if pending and not decoder.done:
+			await loop.run_in_executor(None, decoder.feed, bytes(pending))
+
+		if on_entries is not None and decoder.entries:
+			on_entries()
+
+		if decoder.empty:
+			raise LocationUnavailable
+
+		return AladinOnlineResponse(
+			decoder.finish(),
+			fingerprint=decoder.fingerprint,
+			etag=response.headers.get(hdrs.ETAG),
+			last_modified=response.headers.get(hdrs.LAST_MODIFIED),
+			size=size,
+			decode_time=decoder.decode_time,
+		)
@@ -0,0 +1,273 @@
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timedelta
+from homeassistant import core
+from homeassistant.util import dt
+from homeassistant.util.hass_dict import HassKey
+import math
+import mmap
+import os
+import struct
+from .const import (
+	ARCHIVE_DIRECTORY,
+	ARCHIVE_RETENTION,
+	DOMAIN,
+)
+from .forecast import AladinForecast, METEOGRAM_COLUMNS
+from typing import Any, Dict, Iterator, List, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+	from .cache import CacheKey
+
+# File layout: a header, then fixed-width little-endian records, one per hour of an archived model run.
+# Record: start of the model run and validity time (epoch seconds), weather icon,
+# then the meteogram columns as 32-bit floats in the order of METEOGRAM_COLUMNS, NaN for missing values.
+ARCHIVE_MAGIC = b"ALAR"
+ARCHIVE_VERSION = 1
+ARCHIVE_COLUMNS: Tuple[str, ...] = tuple(METEOGRAM_COLUMNS)
+
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<IIH{}f".format(len(ARCHIVE_COLUMNS)))
+
+# Index of the first column value in an unpacked record
+VALUES_START = 3
+
+DATA_ARCHIVES: HassKey[Dict[CacheKey, AladinOnlineArchive]] = HassKey("{}_archives".format(DOMAIN))
+
+
+class AladinArchiveSkill:
+	"""Errors of the archived forecasts against the realized values, for one range of lead times."""
+
+	__slots__ = ("count", "bias", "mae", "rmse")
+
+	def __init__(self) -> None:
+		self.count: int = 0
+		self.bias: float = 0
+		self.mae: float = 0
+		self.rmse: float = 0
+
+	def add(self, error: float) -> None:
+		self.count += 1
+		self.bias += error
+		self.mae += abs(error)
+		self.rmse += error * error
+
+	def finish(self) -> AladinArchiveSkill:
+		if self.count > 0:
+			self.bias /= self.count
+			self.mae /= self.count
+			self.rmse = math.sqrt(self.rmse / self.count)
+
+		return self
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {
+			"count": self.count,
+			"bias": self.bias,
+			"mae": self.mae,
+			"rmse": self.rmse,
+		}
+
+
+class AladinOnlineArchive:
+	"""Append-only archive of the model runs of one location.
+
+	The file is read through mmap and written only by appends, except for the eviction of expired runs.
+	The methods do blocking I/O, the async ones run them in the executor one at a time.
+	"""
+
+	def __init__(self, hass: core.HomeAssistant, path: str, retention: timedelta = ARCHIVE_RETENTION) -> None:
+		self._hass: core.HomeAssistant = hass
+		self._lock: asyncio.Lock = asyncio.Lock()
+		self.path: str = path
+		self.retention: timedelta = retention
+		self._loaded: bool = False
+		self._records: int = 0
+		# Model run and validity time of the archived hours, the same hour of a run is archived only once
+		self._index: Set[Tuple[int, int]] = set()
+		self._runs: Set[int] = set()
+
+	@property
+	def records(self) -> int:
+		return self._records
+
+	@property
+	def runs(self) -> int:
+		return len(self._runs)
+
+	async def async_append(self, data: Dict[str, Any]) -> int:
+		async with self._lock:
+			return await self._hass.async_add_executor_job(self.append, data, dt.utcnow())
+
+	async def async_skill(self, bucket_hours: int = 6) -> Dict[str, Dict[int, AladinArchiveSkill]]:
+		async with self._lock:
+			return await self._hass.async_add_executor_job(self.skill, bucket_hours)
+
+	def append(self, data: Dict[str, Any], now: datetime) -> int:
+		# Only the writer repairs the file, reads never change it
+		self._repair()
+		self._load()
+
+		entries = data.get("data", [])
+		if not entries:
+			return 0
+
+		# The first entry of the meteogram is the start of the model run it comes from
+		run = int(dt.parse_datetime(entries[0]["validityTime"]).timestamp())
+
+		packed = bytearray()
+		for entry in entries:
+			validity = int(dt.parse_datetime(entry["validityTime"]).timestamp())
+			if (run, validity) in self._index:
+				continue
+
+			# The values are cleaned like the columns of the forecast, invalid ones must not stop the archive
+			packed += RECORD.pack(
+				run,
+				validity,
+				AladinForecast.format_icon(entry.get("icon", 0)),
+				*(AladinForecast.format_value(entry.get(key, default)) for key, default in METEOGRAM_COLUMNS.values()),
+			)
+			self._index.add((run, validity))
+
+		if packed:
+			os.makedirs(os.path.dirname(self.path), exist_ok=True)
+			with open(self.path, "ab") as file:
+				if file.tell() == 0:
+					file.write(HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, RECORD.size))
+				file.write(packed)
+
+			self._records += len(packed) // RECORD.size
+			self._runs.add(run)
+
+		self.evict(now - self.retention)
+
+		return len(packed) // RECORD.size
+
+	def evict(self, before: datetime) -> None:
+		self._load()
+
+		cutoff = before.timestamp()
+		if not self._runs or min(self._runs) >= cutoff:
+			return
+
+		kept = bytearray(HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, RECORD.size))
+		for record in self._iter_records():
+			if record[0] >= cutoff:
+				kept += RECORD.pack(*record)
+
+		# The file is replaced at once, a crash leaves either the old or the new archive
+		temporary_path = "{}.tmp".format(self.path)
+		with open(temporary_path, "wb") as file:
+			file.write(kept)
+		os.replace(temporary_path, self.path)
+
+		self._loaded = False
+		self._load()
+
+	def skill(self, bucket_hours: int = 6) -> Dict[str, Dict[int, AladinArchiveSkill]]:
+		"""Bias, MAE and RMSE of every column by lead time, from one pass over the records.
+
+		The realized value of an hour is the first hour of the model run that starts then,
+		the analysis is the closest the archive has to an observation.
+		"""
+		self._load()
+
+		actual: Dict[int, Tuple] = {}
+		forecasts: List[Tuple] = []
+
+		for record in self._iter_records():
+			lead = record[1] - record[0]
+			if lead == 0:
+				actual[record[1]] = record
+			elif lead > 0:
+				forecasts.append(record)
+
+		skill: Dict[str, Dict[int, AladinArchiveSkill]] = {column: {} for column in ARCHIVE_COLUMNS}
+		for record in forecasts:
+			actual_record = actual.get(record[1])
+			if actual_record is None:
+				continue
+
+			bucket = (record[1] - record[0]) // 3600 // bucket_hours * bucket_hours
+			for column, value, actual_value in zip(ARCHIVE_COLUMNS, record[VALUES_START:], actual_record[VALUES_START:]):
+				# NaN stands for a missing value on either side
+				if value != value or actual_value != actual_value:
+					continue
+
+				if bucket not in skill[column]:
+					skill[column][bucket] = AladinArchiveSkill()
+				skill[column][bucket].add(value - actual_value)
+
+		return {
+			column: {bucket: column_skill[bucket].finish() for bucket in sorted(column_skill)}
+			for column, column_skill in skill.items()
+		}
+
+	def _load(self) -> None:
+		if self._loaded:
+			return
+
+		self._index = set()
+		self._runs = set()
+		self._records = 0
+
+		for record in self._iter_records():
+			self._index.add((record[0], record[1]))
+			self._runs.add(record[0])
+			self._records += 1
+
+		self._loaded = True
+
+	def _repair(self) -> None:
+		try:
+			size = os.path.getsize(self.path)
+		except FileNotFoundError:
+			return
+
+		# A header cut by a crash starts the archive over
+		if size < HEADER.size:
+			os.remove(self.path)
+			self._loaded = False
+			return
+
+		# A record cut by a crash is dropped, the next append is aligned again
+		count = (size - HEADER.size) // RECORD.size
+		if HEADER.size + count * RECORD.size != size:
+			os.truncate(self.path, HEADER.size + count * RECORD.size)
+
+	def _iter_records(self) -> Iterator[Tuple]:
+		try:
+			size = os.path.getsize(self.path)
+		except FileNotFoundError:
+			return
+
+		# Records cut by a crash are skipped here, the next append repairs the file
+		count = max(size - HEADER.size, 0) // RECORD.size
+		if count == 0:
+			return
+
+		with open(self.path, "rb") as file:
+			with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+				magic, version, record_size = HEADER.unpack_from(view)
+				if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION or record_size != RECORD.size:
+					raise ValueError("Unsupported archive: {}".format(self.path))
+
+				# Records are unpacked straight from the mapped file, the view is released before the map is closed
+				with memoryview(view) as buffer:
+					records = list(RECORD.iter_unpack(buffer[HEADER.size:HEADER.size + count * RECORD.size]))
+
+		yield from records
+
+
+def get_archive(hass: core.HomeAssistant, cell: CacheKey) -> AladinOnlineArchive:
+	archives = hass.data.setdefault(DATA_ARCHIVES, {})
+
+	# Entries at the same coordinates share the archive, the same hours are not stored twice
+	if cell not in archives:
+		archives[cell] = AladinOnlineArchive(
+			hass,
+			hass.config.path(DOMAIN, ARCHIVE_DIRECTORY, "{},{}.bin".format(*cell)),
+		)
+
+	return archives[cell]
@@ -0,0 +1,128 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+import math
+from .cache import AladinOnlineCache, CacheKey
+from .const import (
+	AREA_MAX_POINTS,
+	AREA_POINT_SPACING,
+)
+from .forecast import AladinForecast, THUNDERSTORM_ICONS
+from typing import Dict, List, Sequence
+
+# Length of one degree of latitude (km)
+KM_PER_DEGREE = 111.32
+
+
+def area_points(latitude: float, longitude: float, radius: float) -> List[CacheKey]:
+	"""Points of a square lattice covering the circle, the closest to the center first.
+
+	The spacing grows with the radius so the area never needs more than AREA_MAX_POINTS meteograms.
+	"""
+	spacing = max(AREA_POINT_SPACING, radius * math.sqrt(math.pi / AREA_MAX_POINTS))
+	steps = int(radius // spacing)
+
+	offsets = sorted(
+		(
+			(i * spacing, j * spacing)
+			for i in range(-steps, steps + 1)
+			for j in range(-steps, steps + 1)
+			if math.hypot(i * spacing, j * spacing) <= radius
+		),
+		key=lambda offset: math.hypot(*offset),
+	)
+
+	longitude_km = KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01)
+
+	cells: List[CacheKey] = []
+	for north, east in offsets:
+		cell = AladinOnlineCache.cache_key(latitude + north / KM_PER_DEGREE, longitude + east / longitude_km)
+		if cell not in cells:
+			cells.append(cell)
+
+	return cells[:AREA_MAX_POINTS]
+
+
+class AladinAreaForecast:
+	"""Hourly aggregates over the points of an area.
+
+	Hours are matched by their timestamps, an hour counts the points whose forecasts contain it.
+	"""
+
+	__slots__ = ("timestamps", "points", "precipitation_max", "wind_gust_speed_max", "thunderstorm_fraction")
+
+	def __init__(self) -> None:
+		self.timestamps: array = array("d")
+		self.points: array = array("H")
+		self.precipitation_max: array = array("d")
+		self.wind_gust_speed_max: array = array("d")
+		self.thunderstorm_fraction: array = array("d")
+
+	def __len__(self) -> int:
+		return len(self.timestamps)
+
+	def index_at(self, moment: datetime) -> int:
+		return max(bisect_right(self.timestamps, moment.timestamp()) - 1, 0)
+
+	@staticmethod
+	def from_forecasts(forecasts: Sequence[AladinForecast]) -> AladinAreaForecast:
+		points: Dict[float, int] = {}
+		precipitation: Dict[float, float] = {}
+		wind_gust_speed: Dict[float, float] = {}
+		thunderstorms: Dict[float, int] = {}
+
+		for forecast in forecasts:
+			for i, timestamp in enumerate(forecast.timestamps):
+				points[timestamp] = points.get(timestamp, 0) + 1
+				thunderstorms[timestamp] = thunderstorms.get(timestamp, 0) + (forecast.icon[i] in THUNDERSTORM_ICONS)
+
+				# NaN fails every comparison, missing values do not raise the maximum
+				if forecast.precipitation is not None and not forecast.precipitation[i] <= precipitation.get(timestamp, -math.inf):
+					precipitation[timestamp] = forecast.precipitation[i]
+				if forecast.wind_gust_speed is not None and not forecast.wind_gust_speed[i] <= wind_gust_speed.get(timestamp, -math.inf):
+					wind_gust_speed[timestamp] = forecast.wind_gust_speed[i]
+
+		area_forecast = AladinAreaForecast()
+		for timestamp in sorted(points):
+			area_forecast.timestamps.append(timestamp)
+			area_forecast.points.append(points[timestamp])
+			area_forecast.precipitation_max.append(precipitation.get(timestamp, math.nan))
+			area_forecast.wind_gust_speed_max.append(wind_gust_speed.get(timestamp, math.nan))
+			area_forecast.thunderstorm_fraction.append(thunderstorms[timestamp] / points[timestamp])
+
+		return area_forecast
+
+
+class AladinAreaWeather:
+
+	__slots__ = ("forecast", "actual_index")
+
+	def __init__(self, forecast: AladinAreaForecast, actual_index: int) -> None:
+		self.forecast: AladinAreaForecast = forecast
+		self.actual_index: int = actual_index
+
+	@property
+	def points(self) -> int:
+		return self.forecast.points[self.actual_index]
+
+	@property
+	def precipitation_max(self) -> float | None:
+		return AladinAreaWeather._value(self.forecast.precipitation_max[self.actual_index])
+
+	@property
+	def wind_gust_speed_max(self) -> float | None:
+		return AladinAreaWeather._value(self.forecast.wind_gust_speed_max[self.actual_index])
+
+	@property
+	def thunderstorm_fraction(self) -> float:
+		return self.forecast.thunderstorm_fraction[self.actual_index]
+
+	def thunderstorm_fraction_max(self, hours: int) -> float | None:
+		# The current hour is included
+		values = self.forecast.thunderstorm_fraction[self.actual_index:self.actual_index + hours]
+		return max(values) if len(values) > 0 else None
+
+	@staticmethod
+	def _value(value: float) -> float | None:
+		return None if value != value else value
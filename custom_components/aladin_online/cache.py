@@ -0,0 +1,516 @@
+from __future__ import annotations
+from aiohttp import ClientError
+import asyncio
+from datetime import datetime, timedelta
+from functools import partial
+from homeassistant import core
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback, CALLBACK_TYPE, Event
+from homeassistant.helpers import aiohttp_client
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt
+from homeassistant.util.hass_dict import HassKey
+from time import perf_counter
+from .const import (
+	CACHE_TTL,
+	DATA_MIN_HORIZON,
+	DOMAIN,
+	FETCH_CONCURRENCY,
+	LOGGER,
+	MODEL_RUN_INTERVAL,
+	MODEL_RUN_PUBLICATION_DELAY,
+	STORAGE_KEY,
+	STORAGE_SAVE_DELAY,
+	STORAGE_VERSION,
+)
+from .api import async_get_meteogram
+from .errors import LocationUnavailable, ServiceUnavailable
+from .fetch_policy import AladinOnlineFetchPolicy
+from .instrumentation import AladinOnlineFetchStats
+from typing import Any, Callable, Dict, List, Tuple
+
+# Locations share a meteogram only when their coordinates are identical, CHMI computes it for the exact point
+type CacheKey = Tuple[float, float]
+
+DATA_CACHE: HassKey[AladinOnlineCache] = HassKey("{}_cache".format(DOMAIN))
+
+
+class AladinOnlineCacheEntry:
+
+	def __init__(self, cell: CacheKey) -> None:
+		self.cell: CacheKey = cell
+		self.data: Dict[str, Any] | None = None
+		self.fingerprint: str | None = None
+		self.data_checked: datetime | None = None
+		self.etag: str | None = None
+		self.last_modified: str | None = None
+		self.users: int = 0
+		# Forecast horizons of the users, None stands for the whole meteogram
+		self.horizons: List[timedelta | None] = []
+		self.data_horizon: timedelta | None = None
+		self.released: float | None = None
+		self.fetch_task: asyncio.Task | None = None
+		self.failures: int = 0
+		self.retry_after: float | None = None
+		self.listeners: List[Callable[[], None]] = []
+		self.stats: AladinOnlineFetchStats = AladinOnlineFetchStats()
+
+	@property
+	def fetch_horizon(self) -> timedelta | None:
+		if not self.horizons or None in self.horizons:
+			return None
+
+		return max(self.horizons)
+
+	@property
+	def min_horizon(self) -> timedelta:
+		# Meteograms cut at a short horizon are refreshed when half of it has passed
+		if self.data_horizon is None:
+			return DATA_MIN_HORIZON
+
+		return min(DATA_MIN_HORIZON, self.data_horizon / 2)
+
+	def should_update(self) -> bool:
+		if self.data is None or self.data_checked is None:
+			return True
+
+		# A new user needs a longer forecast than the cached one
+		if self.data_horizon is not None and (self.fetch_horizon is None or self.fetch_horizon > self.data_horizon):
+			return True
+
+		entries = self.data.get("data", [])
+		if not entries:
+			return True
+
+		now = dt.utcnow()
+
+		if now - self.data_checked >= MODEL_RUN_INTERVAL:
+			return True
+
+		# The cached forecast is running out
+		if dt.parse_datetime(entries[-1]["validityTime"]) - now < self.min_horizon:
+			return True
+
+		# The first entry of the meteogram is the start of the model run it comes from,
+		# a newer run can be available only after its expected publication time
+		data_model_run = dt.parse_datetime(entries[0]["validityTime"])
+		return data_model_run < AladinOnlineCacheEntry._latest_published_model_run(now)
+
+	def next_update(self) -> datetime | None:
+		if self.data is None or self.data_checked is None:
+			return None
+
+		entries = self.data.get("data", [])
+		if not entries:
+			return None
+
+		data_model_run = dt.parse_datetime(entries[0]["validityTime"])
+
+		return min(
+			self.data_checked + MODEL_RUN_INTERVAL,
+			dt.parse_datetime(entries[-1]["validityTime"]) - self.min_horizon,
+			data_model_run + MODEL_RUN_INTERVAL + MODEL_RUN_PUBLICATION_DELAY,
+		)
+
+	@staticmethod
+	def _latest_published_model_run(now: datetime) -> datetime:
+		published = now - MODEL_RUN_PUBLICATION_DELAY
+		day_start = published.replace(hour=0, minute=0, second=0, microsecond=0)
+		return day_start + ((published - day_start) // MODEL_RUN_INTERVAL) * MODEL_RUN_INTERVAL
+
+
+class AladinOnlineCache:
+	"""Meteograms shared by all config entries, one download per location."""
+
+	def __init__(self, hass: core.HomeAssistant, policy: AladinOnlineFetchPolicy | None = None) -> None:
+		self._hass: core.HomeAssistant = hass
+		self._policy: AladinOnlineFetchPolicy = policy or AladinOnlineFetchPolicy()
+		self._entries: Dict[CacheKey, AladinOnlineCacheEntry] = {}
+		self._store: Store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+		self._stored: Dict[str, Dict[str, Any]] | None = None
+		self._load_lock: asyncio.Lock = asyncio.Lock()
+		self._fetch_semaphore: asyncio.Semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+		self._evict_unsub: CALLBACK_TYPE | None = None
+
+		hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._async_stop)
+
+	@staticmethod
+	def cache_key(latitude: float, longitude: float) -> CacheKey:
+		return (float(latitude), float(longitude))
+
+	@callback
+	def acquire(self, latitude: float, longitude: float, horizon: timedelta | None = None) -> CacheKey:
+		cell = AladinOnlineCache.cache_key(latitude, longitude)
+
+		if cell not in self._entries:
+			self._entries[cell] = AladinOnlineCacheEntry(cell)
+			self._restore_entry(self._entries[cell])
+
+		entry = self._entries[cell]
+		entry.users += 1
+		entry.horizons.append(horizon)
+		entry.released = None
+		self._schedule_eviction()
+
+		return cell
+
+	@callback
+	def release(self, cell: CacheKey, horizon: timedelta | None = None) -> None:
+		entry = self._entries.get(cell)
+		if entry is None:
+			return
+
+		if horizon in entry.horizons:
+			entry.horizons.remove(horizon)
+
+		entry.users = max(entry.users - 1, 0)
+		if entry.users == 0:
+			entry.released = self._hass.loop.time()
+			self._schedule_eviction()
+
+	async def async_load(self) -> None:
+		async with self._load_lock:
+			if self._stored is not None:
+				return
+
+			stored = await self._store.async_load()
+			self._stored = stored.get("cells", {}) if stored is not None else {}
+
+		for entry in self._entries.values():
+			self._restore_entry(entry)
+
+	@callback
+	def get_cached_data(self, cell: CacheKey) -> Dict[str, Any] | None:
+		return self._entries[cell].data
+
+	@callback
+	def get_fingerprint(self, cell: CacheKey) -> str | None:
+		return self._entries[cell].fingerprint
+
+	@callback
+	def get_next_update(self, cell: CacheKey) -> datetime | None:
+		entry = self._entries[cell]
+		next_update = entry.next_update()
+
+		if entry.retry_after is not None:
+			retry_update = dt.utcnow() + timedelta(seconds=max(entry.retry_after - self._hass.loop.time(), 0))
+			if next_update is None or retry_update > next_update:
+				return retry_update
+
+		return next_update
+
+	@callback
+	def get_data_checked(self, cell: CacheKey) -> datetime | None:
+		return self._entries[cell].data_checked
+
+	@callback
+	def get_fetch_stats(self, cell: CacheKey) -> AladinOnlineFetchStats:
+		return self._entries[cell].stats
+
+	@callback
+	def get_data_age(self, cell: CacheKey) -> timedelta | None:
+		data_checked = self._entries[cell].data_checked
+		return None if data_checked is None else dt.utcnow() - data_checked
+
+	@callback
+	def get_failures(self, cell: CacheKey) -> int:
+		return self._entries[cell].failures
+
+	@callback
+	def is_expired(self, cell: CacheKey) -> bool:
+		return self._policy.is_expired(self._entries[cell].data_checked, dt.utcnow())
+
+	@callback
+	def is_due(self, cell: CacheKey) -> bool:
+		next_update = self.get_next_update(cell)
+		return next_update is None or next_update <= dt.utcnow()
+
+	@callback
+	def get_refresh_offset(self, key: str) -> timedelta:
+		return self._policy.refresh_offset(key)
+
+	@callback
+	def async_add_listener(self, cell: CacheKey, update_callback: Callable[[], None]) -> Callable[[], None]:
+		"""Listen for meteograms downloaded in the background."""
+		listeners = self._entries[cell].listeners
+		listeners.append(update_callback)
+
+		@callback
+		def remove_listener() -> None:
+			if update_callback in listeners:
+				listeners.remove(update_callback)
+
+		return remove_listener
+
+	async def async_get_data(self, cell: CacheKey) -> Dict[str, Any]:
+		entry = self._entries[cell]
+		servable = entry.data is not None and not self.is_expired(cell)
+
+		fetch_task = entry.fetch_task
+		if fetch_task is None and entry.should_update() and not self._is_backing_off(entry):
+			fetch_task = self._async_start_fetch(entry)
+
+		if fetch_task is None:
+			entry.stats.hits += 1
+		elif servable:
+			# Stale-while-revalidate: data within the staleness limit is served at once
+			# and the listeners of the location get the new meteogram when it arrives
+			entry.stats.stale_hits += 1
+		else:
+			entry.stats.misses += 1
+			# Every coordinator of the location waits for the same download
+			await asyncio.shield(fetch_task)
+
+		if entry.data is None or self.is_expired(cell):
+			raise ServiceUnavailable
+
+		return entry.data
+
+	async def async_prefetch(self, latitude: float, longitude: float) -> None:
+		"""Check the meteogram of a location being configured, its config entry then gets it from the cache.
+
+		Returns once the meteogram has hourly entries, the rest of it is downloaded in the background.
+		"""
+		await self.async_load()
+
+		cell = AladinOnlineCache.cache_key(latitude, longitude)
+
+		if cell not in self._entries:
+			self._entries[cell] = AladinOnlineCacheEntry(cell)
+			self._restore_entry(self._entries[cell])
+			# Without a config entry the meteogram is kept as long as a released one
+			self._entries[cell].released = self._hass.loop.time()
+			self._schedule_eviction()
+
+		entry = self._entries[cell]
+
+		# A download of the location is running already, e.g. for another config entry
+		if entry.fetch_task is not None:
+			await asyncio.shield(entry.fetch_task)
+
+		if entry.data is not None and not self.is_expired(cell) and not entry.should_update():
+			return
+
+		confirmed = self._hass.loop.create_future()
+		entry.fetch_task = self._hass.async_create_task(self._async_prefetch(entry, confirmed))
+		entry.fetch_task.add_done_callback(partial(AladinOnlineCache._fetch_done, entry))
+		await confirmed
+
+	@callback
+	def _is_backing_off(self, entry: AladinOnlineCacheEntry) -> bool:
+		return entry.retry_after is not None and self._hass.loop.time() < entry.retry_after
+
+	@callback
+	def _async_start_fetch(self, entry: AladinOnlineCacheEntry) -> asyncio.Task:
+		fetch_task = self._hass.async_create_task(self._async_fetch(entry))
+
+		if not fetch_task.done():
+			entry.fetch_task = fetch_task
+			fetch_task.add_done_callback(partial(AladinOnlineCache._fetch_done, entry))
+
+		return fetch_task
+
+	@staticmethod
+	def _fetch_done(entry: AladinOnlineCacheEntry, fetch_task: asyncio.Task) -> None:
+		if entry.fetch_task is fetch_task:
+			entry.fetch_task = None
+
+	async def _async_fetch(self, entry: AladinOnlineCacheEntry) -> None:
+		fingerprint = entry.fingerprint
+
+		for attempt in range(self._policy.retries):
+			if attempt > 0:
+				await asyncio.sleep(self._policy.retry_delay(attempt - 1))
+
+			try:
+				# Many locations, e.g. of a batch entry, are downloaded only a few at a time
+				async with self._fetch_semaphore:
+					await self._async_fetch_once(entry)
+			except (ServiceUnavailable, LocationUnavailable, ClientError, asyncio.TimeoutError, ValueError) as ex:
+				entry.stats.failed_requests += 1
+				LOGGER.debug("Download of the meteogram for %s failed (attempt %d): %s", entry.cell, attempt + 1, repr(ex))
+				continue
+
+			entry.failures = 0
+			entry.retry_after = None
+
+			AladinOnlineCache._notify_listeners(entry, fingerprint)
+
+			return
+
+		# Failures are not raised, the waiting coordinators find out from the cached data
+		entry.failures += 1
+		entry.stats.failed_refreshes += 1
+		entry.retry_after = self._hass.loop.time() + self._policy.failure_delay(entry.failures)
+		LOGGER.warning("Meteogram for %s is unavailable, %d failed refreshes in a row", entry.cell, entry.failures)
+
+	async def _async_prefetch(self, entry: AladinOnlineCacheEntry, confirmed: asyncio.Future) -> None:
+		fingerprint = entry.fingerprint
+
+		@callback
+		def confirm() -> None:
+			if not confirmed.done():
+				confirmed.set_result(None)
+
+		try:
+			async with self._fetch_semaphore:
+				await self._async_fetch_once(entry, on_entries=confirm)
+		except Exception as ex:
+			entry.stats.failed_requests += 1
+			# A failure after the confirmation leaves the download to the first refresh
+			if not confirmed.done():
+				confirmed.set_exception(ex)
+			return
+		finally:
+			# A cancelled download, e.g. on shutdown, must not leave the config flow waiting
+			if not confirmed.done():
+				confirmed.set_exception(ServiceUnavailable())
+
+		confirm()
+		AladinOnlineCache._notify_listeners(entry, fingerprint)
+
+	@staticmethod
+	def _notify_listeners(entry: AladinOnlineCacheEntry, fingerprint: str | None) -> None:
+		if entry.fingerprint == fingerprint:
+			return
+
+		for update_callback in list(entry.listeners):
+			update_callback()
+
+	async def _async_fetch_once(self, entry: AladinOnlineCacheEntry, on_entries: Callable[[], None] | None = None) -> None:
+		latitude, longitude = entry.cell
+		horizon = entry.fetch_horizon
+		# The server can confirm only the whole meteogram, a cut one is always downloaded again
+		use_validators = entry.data is not None and entry.data_horizon is None and horizon is None
+
+		entry.stats.requests += 1
+		fetch_start = perf_counter()
+
+		response = await async_get_meteogram(
+			aiohttp_client.async_get_clientsession(self._hass),
+			latitude,
+			longitude,
+			self._policy.timeout,
+			self._policy.max_body_size,
+			horizon=dt.utcnow() + horizon if horizon is not None else None,
+			etag=entry.etag if use_validators else None,
+			last_modified=entry.last_modified if use_validators else None,
+			on_entries=on_entries,
+		)
+
+		entry.stats.fetch.record(perf_counter() - fetch_start)
+
+		if response.data is None:
+			entry.stats.not_modified += 1
+			entry.data_checked = dt.utcnow()
+			self._schedule_save()
+			return
+
+		# The same meteogram can be served again without validators, keep the decoded one
+		if response.fingerprint != entry.fingerprint or entry.data is None:
+			entry.data = response.data
+			entry.fingerprint = response.fingerprint
+
+		entry.data_horizon = horizon
+		entry.stats.decode.record(response.decode_time)
+		entry.stats.payload_size = response.size
+
+		entry.data_checked = dt.utcnow()
+		entry.etag = response.etag
+		entry.last_modified = response.last_modified
+		self._schedule_save()
+
+	@callback
+	def _restore_entry(self, entry: AladinOnlineCacheEntry) -> None:
+		if entry.data is not None or self._stored is None:
+			return
+
+		stored_entry = self._stored.get(AladinOnlineCache._storage_cell_key(entry.cell))
+		if stored_entry is None:
+			return
+
+		entry.data = stored_entry["data"]
+		entry.fingerprint = stored_entry.get("fingerprint")
+		entry.data_checked = dt.parse_datetime(stored_entry["data_checked"])
+		entry.etag = stored_entry.get("etag")
+		entry.last_modified = stored_entry.get("last_modified")
+		if stored_entry.get("horizon") is not None:
+			entry.data_horizon = timedelta(seconds=stored_entry["horizon"])
+
+	@callback
+	def _schedule_save(self) -> None:
+		self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+	@callback
+	def _data_to_save(self) -> Dict[str, Any]:
+		now = dt.utcnow()
+
+		# Keep stored meteograms of config entries that have not been set up yet, unless they are outdated
+		cells = {}
+		for cell_key, stored_entry in (self._stored or {}).items():
+			entries = stored_entry["data"].get("data", [])
+			if entries and dt.parse_datetime(entries[-1]["validityTime"]) > now:
+				cells[cell_key] = stored_entry
+
+		for cell, entry in self._entries.items():
+			if entry.data is None or entry.data_checked is None:
+				continue
+
+			cells[AladinOnlineCache._storage_cell_key(cell)] = {
+				"data": entry.data,
+				"fingerprint": entry.fingerprint,
+				"data_checked": entry.data_checked.isoformat(),
+				"etag": entry.etag,
+				"last_modified": entry.last_modified,
+				"horizon": None if entry.data_horizon is None else entry.data_horizon.total_seconds(),
+			}
+
+		return {"cells": cells}
+
+	@staticmethod
+	def _storage_cell_key(cell: CacheKey) -> str:
+		return "{},{}".format(*cell)
+
+	@callback
+	def _schedule_eviction(self) -> None:
+		# One timer for all released meteograms, set to the expiry of the earliest one
+		if self._evict_unsub is not None:
+			self._evict_unsub()
+			self._evict_unsub = None
+
+		released = [entry.released for entry in self._entries.values() if entry.users == 0 and entry.released is not None]
+		if not released:
+			return
+
+		# A meteogram kept by its running download is checked again a second later at the soonest
+		delay = max(min(released) + CACHE_TTL.total_seconds() - self._hass.loop.time(), 1)
+		self._evict_unsub = async_call_later(self._hass, delay, self._evict_expired)
+
+	@callback
+	def _async_stop(self, _event: Event) -> None:
+		if self._evict_unsub is not None:
+			self._evict_unsub()
+			self._evict_unsub = None
+
+	@callback
+	def _evict_expired(self, _now: datetime | None = None) -> None:
+		self._evict_unsub = None
+		expire_before = self._hass.loop.time() - CACHE_TTL.total_seconds()
+
+		for cell, entry in list(self._entries.items()):
+			if entry.users == 0 and entry.released is not None and entry.released <= expire_before and entry.fetch_task is None:
+				del self._entries[cell]
+				if self._stored is not None:
+					self._stored.pop(AladinOnlineCache._storage_cell_key(cell), None)
+				self._schedule_save()
+
+		self._schedule_eviction()
+
+
+@callback
+def get_cache(hass: core.HomeAssistant) -> AladinOnlineCache:
+	if DATA_CACHE not in hass.data:
+		hass.data[DATA_CACHE] = AladinOnlineCache(hass)
+
+	return hass.data[DATA_CACHE]
@@ -0,0 +1,86 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+from homeassistant.util import dt
+from .forecast import AladinForecast, THUNDERSTORM_ICONS
+from typing import Any, Dict, List
+
+
+class AladinForecastChangeThresholds:
+	"""Smallest changes between two model runs that are reported."""
+
+	__slots__ = ("temperature", "precipitation_onset")
+
+	def __init__(self, temperature: float, precipitation_onset: timedelta) -> None:
+		self.temperature: float = temperature
+		self.precipitation_onset: timedelta = precipitation_onset
+
+
+def diff_forecasts(
+	previous: AladinForecast,
+	current: AladinForecast,
+	thresholds: AladinForecastChangeThresholds,
+	now: datetime,
+) -> Dict[str, Any]:
+	"""Changes of the hours ahead between two parsed forecasts, only those crossing the thresholds.
+
+	Hours are matched by their timestamps, hours missing in one of the forecasts are not compared.
+	"""
+	changes: Dict[str, Any] = {}
+
+	# The rain onset is answered by the lookahead of both forecasts, without a pass over the hours
+	if previous.precipitation is not None and current.precipitation is not None:
+		previous_onset = _next_precipitation(previous, now)
+		current_onset = _next_precipitation(current, now)
+
+		if (previous_onset is None) != (current_onset is None) or (
+			previous_onset is not None and abs(current_onset - previous_onset) >= thresholds.precipitation_onset
+		):
+			changes["precipitation_onset"] = {
+				"previous": previous_onset.isoformat() if previous_onset is not None else None,
+				"current": current_onset.isoformat() if current_onset is not None else None,
+			}
+
+	# The hour that is running and the hours after it
+	start = current.index_at(now)
+	previous_indexes = {timestamp: i for i, timestamp in enumerate(previous.timestamps)}
+
+	compare_temperature = previous.temperature is not None and current.temperature is not None
+	temperature_hours = 0
+	temperature_change = 0.0
+	temperature_time: float | None = None
+	thunderstorm_hours: List[str] = []
+
+	for i in range(start, len(current)):
+		timestamp = current.timestamps[i]
+		previous_index = previous_indexes.get(timestamp)
+		if previous_index is None:
+			continue
+
+		if compare_temperature:
+			# NaN fails the comparison, a missing value is not a change
+			change = current.temperature[i] - previous.temperature[previous_index]
+			if abs(change) >= thresholds.temperature:
+				temperature_hours += 1
+				if abs(change) > abs(temperature_change):
+					temperature_change = change
+					temperature_time = timestamp
+
+		if current.icon[i] in THUNDERSTORM_ICONS and previous.icon[previous_index] not in THUNDERSTORM_ICONS:
+			thunderstorm_hours.append(dt.utc_from_timestamp(timestamp).isoformat())
+
+	if temperature_hours > 0:
+		changes["temperature"] = {
+			"hours": temperature_hours,
+			"max_change": round(temperature_change, 1),
+			"max_change_time": dt.utc_from_timestamp(temperature_time).isoformat(),
+		}
+
+	if thunderstorm_hours:
+		changes["thunderstorm_hours"] = thunderstorm_hours
+
+	return changes
+
+
+def _next_precipitation(forecast: AladinForecast, now: datetime) -> datetime | None:
+	index = forecast.lookahead.next_precipitation(forecast.index_at(now))
+	return None if index is None else dt.utc_from_timestamp(forecast.timestamps[index])
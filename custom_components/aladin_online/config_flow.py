@@ -1,23 +1,67 @@
 from __future__ import annotations
+from aiohttp import ClientError
+import asyncio
 from homeassistant import config_entries
 from homeassistant.const import (
 	CONF_NAME,
 	CONF_LATITUDE,
 	CONF_LONGITUDE,
 )
+from homeassistant.core import callback
 from homeassistant.data_entry_flow import AbortFlow, FlowResult
-from homeassistant.helpers import aiohttp_client
-from http import HTTPStatus
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.selector import (
+	SelectSelector,
+	SelectSelectorConfig,
+	SelectSelectorMode,
+	TextSelector,
+	TextSelectorConfig,
+)
 import voluptuous as vol
-from .const import DOMAIN, NAME, URL, LOGGER
+from .const import (
+	AREA_RADIUS_MAX,
+	CONF_ARCHIVE,
+	CONF_CHANGE_EVENTS,
+	CONF_CHANGE_PRECIPITATION_ONSET,
+	CONF_CHANGE_TEMPERATURE,
+	CONF_DEADBAND,
+	CONF_FORECAST_FIELDS,
+	CONF_FORECAST_HORIZON,
+	CONF_INTERPOLATION,
+	CONF_INTERPOLATION_INTERVAL,
+	CONF_LOCATIONS,
+	CONF_RADIUS,
+	DEFAULT_AREA_RADIUS,
+	DEFAULT_CHANGE_PRECIPITATION_ONSET,
+	DEFAULT_CHANGE_TEMPERATURE,
+	DEFAULT_FORECAST_HORIZON,
+	DEFAULT_INTERPOLATION_INTERVAL,
+	DOMAIN,
+	FORECAST_HORIZONS,
+	NAME,
+	URL,
+	LOGGER,
+)
+from .cache import get_cache
 from .errors import LocationUnavailable, ServiceUnavailable
-from typing import Any, Dict
+from .forecast import AladinForecastField
+from typing import Any, Dict, List
 
 class AladinOnlineConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 	"""Weather forecast config flow."""
 
+	@staticmethod
+	@callback
+	def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> AladinOnlineOptionsFlow:
+		return AladinOnlineOptionsFlow(config_entry)
+
 	async def async_step_user(self, user_input: Dict[str, Any] | None = None) -> FlowResult:
+		return self.async_show_menu(
+			step_id="user",
+			menu_options=["location", "batch", "area"],
+		)
+
+	async def async_step_location(self, user_input: Dict[str, Any] | None = None) -> FlowResult:
 		errors = {}
 		if user_input is not None:
 			try:
@@ -43,16 +87,95 @@ class AladinOnlineConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 				return self.async_abort(reason="unknown")
 
 		return self.async_show_form(
-			step_id="user",
+			step_id="location",
+			data_schema=vol.Schema({
+				vol.Required(CONF_NAME, default=self.hass.config.location_name): str,
+				vol.Required(CONF_LATITUDE, default=self.hass.config.latitude): cv.latitude,
+				vol.Required(CONF_LONGITUDE, default=self.hass.config.longitude): cv.longitude,
+			}),
+			errors=errors,
+		)
+
+	async def async_step_batch(self, user_input: Dict[str, Any] | None = None) -> FlowResult:
+		errors = {}
+		if user_input is not None:
+			try:
+				locations = _parse_locations(user_input[CONF_LOCATIONS])
+				config = {
+					CONF_NAME: user_input[CONF_NAME],
+					CONF_LOCATIONS: locations,
+				}
+				await self.async_set_unique_id(user_input[CONF_NAME])
+				self._abort_if_unique_id_configured()
+
+				await self._async_validate_locations(locations)
+
+				return self.async_create_entry(title=NAME, data=config)
+			except AbortFlow as ex:
+				return self.async_abort(reason=ex.reason)
+			except vol.Invalid:
+				errors[CONF_LOCATIONS] = "invalid_locations"
+			except ServiceUnavailable:
+				errors["base"] = "service_unavailable"
+			except LocationUnavailable:
+				errors["base"] = "location_unavailable"
+			except Exception:
+				LOGGER.exception("Unknown error validating the locations")
+				return self.async_abort(reason="unknown")
+
+		return self.async_show_form(
+			step_id="batch",
+			data_schema=vol.Schema({
+				vol.Required(CONF_NAME, default=self.hass.config.location_name): str,
+				vol.Required(CONF_LOCATIONS): TextSelector(TextSelectorConfig(multiline=True)),
+			}),
+			errors=errors,
+		)
+
+	async def async_step_area(self, user_input: Dict[str, Any] | None = None) -> FlowResult:
+		errors = {}
+		if user_input is not None:
+			try:
+				config = {
+					CONF_NAME: user_input[CONF_NAME],
+					CONF_LATITUDE: user_input[CONF_LATITUDE],
+					CONF_LONGITUDE: user_input[CONF_LONGITUDE],
+					CONF_RADIUS: user_input[CONF_RADIUS],
+				}
+				await self.async_set_unique_id(user_input[CONF_NAME])
+				self._abort_if_unique_id_configured()
+
+				# The center stands for the area, the other points are fetched by the first refresh
+				await self._async_validate_location(user_input[CONF_LATITUDE], user_input[CONF_LONGITUDE])
+
+				return self.async_create_entry(title=NAME, data=config)
+			except AbortFlow as ex:
+				return self.async_abort(reason=ex.reason)
+			except ServiceUnavailable:
+				errors["base"] = "service_unavailable"
+			except LocationUnavailable:
+				errors["base"] = "location_unavailable"
+			except Exception:
+				LOGGER.error("Unknown error connecting to %s", URL.format(user_input[CONF_LONGITUDE], user_input[CONF_LATITUDE]))
+				return self.async_abort(reason="unknown")
+
+		return self.async_show_form(
+			step_id="area",
 			data_schema=vol.Schema({
 				vol.Required(CONF_NAME, default=self.hass.config.location_name): str,
 				vol.Required(CONF_LATITUDE, default=self.hass.config.latitude): cv.latitude,
 				vol.Required(CONF_LONGITUDE, default=self.hass.config.longitude): cv.longitude,
+				vol.Required(CONF_RADIUS, default=DEFAULT_AREA_RADIUS): vol.All(vol.Coerce(int), vol.Range(min=1, max=AREA_RADIUS_MAX)),
 			}),
 			errors=errors,
 		)
 
 	async def async_step_reconfigure(self, user_input: Dict[str, Any] | None = None) -> FlowResult:
+		if CONF_RADIUS in self._get_reconfigure_entry().data:
+			return await self.async_step_reconfigure_area(user_input)
+		if CONF_LOCATIONS in self._get_reconfigure_entry().data:
+			return await self.async_step_reconfigure_batch(user_input)
+
 		errors = {}
 		reconfigure_entry = self._get_reconfigure_entry()
 		if user_input is not None:
@@ -85,10 +208,187 @@ class AladinOnlineConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 			errors=errors,
 		)
 
+	async def async_step_reconfigure_batch(self, user_input: Dict[str, Any] | None = None) -> FlowResult:
+		errors = {}
+		reconfigure_entry = self._get_reconfigure_entry()
+		if user_input is not None:
+			try:
+				locations = _parse_locations(user_input[CONF_LOCATIONS])
+				config = {
+					CONF_NAME: reconfigure_entry.data[CONF_NAME],
+					CONF_LOCATIONS: locations,
+				}
+
+				await self._async_validate_locations(locations)
+
+				return self.async_update_reload_and_abort(reconfigure_entry, data=config)
+			except AbortFlow as ex:
+				return self.async_abort(reason=ex.reason)
+			except vol.Invalid:
+				errors[CONF_LOCATIONS] = "invalid_locations"
+			except ServiceUnavailable:
+				errors["base"] = "service_unavailable"
+			except LocationUnavailable:
+				errors["base"] = "location_unavailable"
+			except Exception:
+				LOGGER.exception("Unknown error validating the locations")
+				return self.async_abort(reason="unknown")
+
+		return self.async_show_form(
+			step_id="reconfigure_batch",
+			data_schema=vol.Schema({
+				vol.Required(
+					CONF_LOCATIONS,
+					default=_format_locations(reconfigure_entry.data[CONF_LOCATIONS]),
+				): TextSelector(TextSelectorConfig(multiline=True)),
+			}),
+			errors=errors,
+		)
+
+	async def async_step_reconfigure_area(self, user_input: Dict[str, Any] | None = None) -> FlowResult:
+		errors = {}
+		reconfigure_entry = self._get_reconfigure_entry()
+		if user_input is not None:
+			try:
+				config = {
+					CONF_NAME: reconfigure_entry.data[CONF_NAME],
+					CONF_LATITUDE: user_input[CONF_LATITUDE],
+					CONF_LONGITUDE: user_input[CONF_LONGITUDE],
+					CONF_RADIUS: user_input[CONF_RADIUS],
+				}
+
+				await self._async_validate_location(user_input[CONF_LATITUDE], user_input[CONF_LONGITUDE])
+
+				return self.async_update_reload_and_abort(reconfigure_entry, data=config)
+			except AbortFlow as ex:
+				return self.async_abort(reason=ex.reason)
+			except ServiceUnavailable:
+				errors["base"] = "service_unavailable"
+			except LocationUnavailable:
+				errors["base"] = "location_unavailable"
+			except Exception:
+				LOGGER.error("Unknown error connecting to %s", URL.format(user_input[CONF_LONGITUDE], user_input[CONF_LATITUDE]))
+				return self.async_abort(reason="unknown")
+
+		return self.async_show_form(
+			step_id="reconfigure_area",
+			data_schema=vol.Schema({
+				vol.Required(CONF_LATITUDE, default=reconfigure_entry.data[CONF_LATITUDE]): cv.latitude,
+				vol.Required(CONF_LONGITUDE, default=reconfigure_entry.data[CONF_LONGITUDE]): cv.longitude,
+				vol.Required(CONF_RADIUS, default=reconfigure_entry.data[CONF_RADIUS]): vol.All(vol.Coerce(int), vol.Range(min=1, max=AREA_RADIUS_MAX)),
+			}),
+			errors=errors,
+		)
+
+	async def _async_validate_locations(self, locations: List[Dict[str, Any]]) -> None:
+		# The shared cache bounds how many downloads run at once
+		await asyncio.gather(*(
+			self._async_validate_location(location[CONF_LATITUDE], location[CONF_LONGITUDE])
+			for location in locations
+		))
+
 	async def _async_validate_location(self, latitude: float, longitude: float) -> None:
-		session = aiohttp_client.async_get_clientsession(self.hass)
-		response = await session.get(URL.format(longitude, latitude))
-		if response.status != HTTPStatus.OK:
-			raise ServiceUnavailable
-		if await response.text() == "":
-			raise LocationUnavailable
+		try:
+			# The meteogram is handed to the new config entry, its first refresh does not download it again
+			await get_cache(self.hass).async_prefetch(latitude, longitude)
+		except (ClientError, asyncio.TimeoutError) as ex:
+			raise ServiceUnavailable from ex
+
+def _parse_locations(text: str) -> List[Dict[str, Any]]:
+	"""One location per line: name, latitude, longitude."""
+	locations = []
+	names = set()
+
+	for line in text.splitlines():
+		if line.strip() == "":
+			continue
+
+		parts = [part.strip() for part in line.rsplit(",", 2)]
+		if len(parts) != 3 or parts[0] == "" or parts[0] in names:
+			raise vol.Invalid("Invalid location: {}".format(line))
+
+		names.add(parts[0])
+		locations.append({
+			CONF_NAME: parts[0],
+			CONF_LATITUDE: cv.latitude(parts[1]),
+			CONF_LONGITUDE: cv.longitude(parts[2]),
+		})
+
+	if not locations:
+		raise vol.Invalid("No locations")
+
+	return locations
+
+
+def _format_locations(locations: List[Dict[str, Any]]) -> str:
+	return "\n".join(
+		"{}, {}, {}".format(location[CONF_NAME], location[CONF_LATITUDE], location[CONF_LONGITUDE])
+		for location in locations
+	)
+
+
+class AladinOnlineOptionsFlow(config_entries.OptionsFlow):
+	"""Weather forecast options flow."""
+
+	def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+		# The entry is kept by the flow itself, OptionsFlow provides it only since Home Assistant 2024.11
+		self._config_entry: config_entries.ConfigEntry = config_entry
+
+	async def async_step_init(self, user_input: Dict[str, Any] | None = None) -> FlowResult:
+		errors = {}
+		if user_input is not None:
+			# Without a field the entities would have nothing to show
+			if CONF_FORECAST_FIELDS in user_input and not user_input[CONF_FORECAST_FIELDS]:
+				errors[CONF_FORECAST_FIELDS] = "no_forecast_fields"
+			else:
+				return self.async_create_entry(data=user_input)
+
+		options = user_input if user_input is not None else self._config_entry.options
+
+		schema = {
+			vol.Required(
+				CONF_FORECAST_HORIZON,
+				default=options.get(CONF_FORECAST_HORIZON, DEFAULT_FORECAST_HORIZON),
+			): SelectSelector(SelectSelectorConfig(
+				options=FORECAST_HORIZONS,
+				mode=SelectSelectorMode.DROPDOWN,
+				translation_key=CONF_FORECAST_HORIZON,
+			)),
+			vol.Required(CONF_DEADBAND, default=options.get(CONF_DEADBAND, True)): bool,
+		}
+
+		# Areas aggregate fixed fields of their points, only the horizon applies to them
+		if CONF_RADIUS not in self._config_entry.data:
+			schema = {
+				vol.Required(CONF_INTERPOLATION, default=options.get(CONF_INTERPOLATION, False)): bool,
+				vol.Required(
+					CONF_INTERPOLATION_INTERVAL,
+					default=options.get(CONF_INTERPOLATION_INTERVAL, DEFAULT_INTERPOLATION_INTERVAL),
+				): vol.All(vol.Coerce(int), vol.Range(min=1, max=30)),
+				**schema,
+				vol.Required(
+					CONF_FORECAST_FIELDS,
+					default=options.get(CONF_FORECAST_FIELDS, list(AladinForecastField)),
+				): SelectSelector(SelectSelectorConfig(
+					options=list(AladinForecastField),
+					multiple=True,
+					mode=SelectSelectorMode.LIST,
+					translation_key=CONF_FORECAST_FIELDS,
+				)),
+				vol.Required(CONF_ARCHIVE, default=options.get(CONF_ARCHIVE, False)): bool,
+				vol.Required(CONF_CHANGE_EVENTS, default=options.get(CONF_CHANGE_EVENTS, False)): bool,
+				vol.Required(
+					CONF_CHANGE_TEMPERATURE,
+					default=options.get(CONF_CHANGE_TEMPERATURE, DEFAULT_CHANGE_TEMPERATURE),
+				): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=20)),
+				vol.Required(
+					CONF_CHANGE_PRECIPITATION_ONSET,
+					default=options.get(CONF_CHANGE_PRECIPITATION_ONSET, DEFAULT_CHANGE_PRECIPITATION_ONSET),
+				): vol.All(vol.Coerce(int), vol.Range(min=1, max=24)),
+			}
+
+		return self.async_show_form(
+			step_id="init",
+			data_schema=vol.Schema(schema),
+			errors=errors,
+		)
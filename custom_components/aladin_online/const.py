@@ -1,3 +1,4 @@
+from datetime import timedelta
 import logging
 from typing import Final
 
@@ -5,3 +6,82 @@ LOGGER: Final = logging.getLogger(__package__)
 DOMAIN: Final = "aladin_online"
 NAME: Final = "Aladin online (Czech Republic)"
 URL: Final = "https://data-provider.chmi.cz/api/graphs/graf.meteogram/?x={}&y={}"
+
+CONF_ARCHIVE: Final = "archive"
+CONF_CHANGE_EVENTS: Final = "change_events"
+CONF_CHANGE_PRECIPITATION_ONSET: Final = "change_precipitation_onset"
+CONF_CHANGE_TEMPERATURE: Final = "change_temperature"
+CONF_DEADBAND: Final = "deadband"
+CONF_FORECAST_FIELDS: Final = "forecast_fields"
+CONF_FORECAST_HORIZON: Final = "forecast_horizon"
+CONF_INTERPOLATION: Final = "interpolation"
+CONF_INTERPOLATION_INTERVAL: Final = "interpolation_interval"
+CONF_LOCATIONS: Final = "locations"
+CONF_RADIUS: Final = "radius"
+
+DEFAULT_FORECAST_HORIZON: Final = "0"
+DEFAULT_INTERPOLATION_INTERVAL: Final = 10
+DEFAULT_AREA_RADIUS: Final = 10
+DEFAULT_CHANGE_PRECIPITATION_ONSET: Final = 2
+DEFAULT_CHANGE_TEMPERATURE: Final = 2
+
+# Forecast horizons offered in the options (hours), zero keeps the whole meteogram
+FORECAST_HORIZONS: Final = ["0", "12", "24", "48"]
+
+# The network refresh follows the model runs, these bound its interval
+UPDATE_INTERVAL: Final = timedelta(minutes=30)
+UPDATE_INTERVAL_MAX: Final = timedelta(hours=6)
+
+# ALADIN runs every 6 hours (00, 06, 12, 18 UTC), the meteograms are published a few hours later
+MODEL_RUN_INTERVAL: Final = timedelta(hours=6)
+MODEL_RUN_PUBLICATION_DELAY: Final = timedelta(hours=4)
+
+# Scheduled refreshes of the config entries are spread over this window after the data is due
+REFRESH_SPREAD_WINDOW: Final = timedelta(minutes=20)
+
+# Refresh the data sooner when the cached forecast is about to run out
+DATA_MIN_HORIZON: Final = timedelta(hours=12)
+
+# Downloads running at the same time, shared by all config entries
+FETCH_CONCURRENCY: Final = 4
+
+# Refreshes of the locations of a batch entry are spread over this window
+BATCH_STAGGER_WINDOW: Final = timedelta(minutes=10)
+BATCH_UPDATE_INTERVAL_MIN: Final = timedelta(minutes=1)
+
+# Points of an area entry (km), the spacing grows for large areas to keep the number of meteograms bounded
+AREA_RADIUS_MAX: Final = 50
+AREA_POINT_SPACING: Final = 5
+AREA_MAX_POINTS: Final = 25
+
+# Timeouts of a download (seconds) and the largest meteogram accepted (bytes)
+FETCH_CONNECT_TIMEOUT: Final = 10
+FETCH_READ_TIMEOUT: Final = 30
+FETCH_TIMEOUT: Final = 60
+FETCH_MAX_BODY_SIZE: Final = 2 * 1024 * 1024
+
+# Retries of a failed download within one refresh, with jittered exponential backoff (seconds)
+FETCH_RETRIES: Final = 3
+FETCH_RETRY_BACKOFF: Final = 2
+FETCH_RETRY_BACKOFF_MAX: Final = 30
+
+# Pause of all downloads of a location after failed refreshes, doubled with every further failure
+FAILURE_BACKOFF: Final = timedelta(minutes=5)
+FAILURE_BACKOFF_MAX: Final = timedelta(hours=1)
+
+# Cached data older than this is not served and the entities become unavailable
+DATA_MAX_STALENESS: Final = timedelta(hours=12)
+
+# How long the shared cache keeps meteograms no config entry uses anymore
+CACHE_TTL: Final = timedelta(minutes=30)
+
+# Archive of past model runs for the forecast skill, one file per location in the directory of the integration
+ARCHIVE_DIRECTORY: Final = "archive"
+ARCHIVE_RETENTION: Final = timedelta(days=30)
+
+# Fired when a new model run changes the forecast beyond the thresholds in the options
+EVENT_FORECAST_CHANGED: Final = "{}_forecast_changed".format(DOMAIN)
+
+STORAGE_KEY: Final = "{}.cache".format(DOMAIN)
+STORAGE_VERSION: Final = 1
+STORAGE_SAVE_DELAY: Final = 60
@@ -0,0 +1,176 @@
+from __future__ import annotations
+from array import array
+import math
+from typing import Collection
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Quantities derived from temperature (°C), relative humidity (%) and wind speed (m/s)
+# for the whole forecast at once, the data source does not provide them.
+# Columns are arrays of doubles, missing values are NaN and propagate to the results.
+# Quantities that were not requested are None.
+#
+# Saturation vapour pressure (Magnus, hPa):
+#   es = 6.105 · exp(17.27·T / (237.7 + T))
+# Apparent temperature (Steadman / Australian Bureau of Meteorology):
+#   AT = T + 0.33·e − 0.70·ws − 4.00, e = (rh / 100) · es
+# Dew point (Magnus):
+#   γ = ln(rh / 100) + 17.27·T / (237.7 + T), Td = 237.7·γ / (17.27 − γ)
+# Wind chill (Environment Canada, defined for T ≤ 10 °C and wind above 4.8 km/h):
+#   WC = 13.12 + 0.6215·T − 11.37·v^0.16 + 0.3965·T·v^0.16, v in km/h
+# Heat index (Rothfusz regression, defined for T ≥ 26.7 °C, computed in °F)
+# Absolute humidity (g/m³):
+#   AH = e · 100 / (461.5 · (T + 273.15)) · 1000
+
+NAN = float("nan")
+
+QUANTITIES = ("apparent_temperature", "dew_point", "wind_chill", "heat_index", "absolute_humidity")
+
+
+class AladinDerivedQuantities:
+
+	__slots__ = ("apparent_temperature", "dew_point", "wind_chill", "heat_index", "absolute_humidity")
+
+	def __init__(
+		self,
+		apparent_temperature: array | None,
+		dew_point: array | None,
+		wind_chill: array | None,
+		heat_index: array | None,
+		absolute_humidity: array | None,
+	) -> None:
+		self.apparent_temperature = apparent_temperature
+		self.dew_point = dew_point
+		self.wind_chill = wind_chill
+		self.heat_index = heat_index
+		self.absolute_humidity = absolute_humidity
+
+
+def compute_derived_quantities(
+	temperature: array,
+	humidity: array,
+	wind_speed: array,
+	quantities: Collection[str] = QUANTITIES,
+) -> AladinDerivedQuantities:
+	if numpy is not None:
+		return _compute_numpy(temperature, humidity, wind_speed, quantities)
+
+	return _compute_python(temperature, humidity, wind_speed, quantities)
+
+
+def _compute_numpy(temperature: array, humidity: array, wind_speed: array, quantities: Collection[str]) -> AladinDerivedQuantities:
+	t = numpy.frombuffer(temperature, dtype=numpy.float64)
+	rh = numpy.frombuffer(humidity, dtype=numpy.float64)
+	ws = numpy.frombuffer(wind_speed, dtype=numpy.float64)
+
+	apparent_temperature = None
+	dew_point = None
+	wind_chill = None
+	heat_index = None
+	absolute_humidity = None
+
+	with numpy.errstate(divide="ignore", invalid="ignore"):
+		magnus = 17.27 * t / (237.7 + t)
+		vapour_pressure = (rh / 100) * 6.105 * numpy.exp(magnus)
+
+		if "apparent_temperature" in quantities:
+			apparent_temperature = _numpy_to_array(t + 0.33 * vapour_pressure - 0.70 * ws - 4.00)
+
+		if "dew_point" in quantities:
+			gamma = numpy.log(rh / 100) + magnus
+			dew_point = _numpy_to_array(numpy.where(rh > 0, 237.7 * gamma / (17.27 - gamma), numpy.nan))
+
+		if "wind_chill" in quantities:
+			wind_kmh_power = (ws * 3.6) ** 0.16
+			wind_chill = _numpy_to_array(numpy.where(
+				(t <= 10) & (ws * 3.6 > 4.8),
+				13.12 + 0.6215 * t - 11.37 * wind_kmh_power + 0.3965 * t * wind_kmh_power,
+				t,
+			))
+
+		if "heat_index" in quantities:
+			heat_index = _numpy_to_array(numpy.where(t >= 26.7, _heat_index_rothfusz(t, rh), t))
+
+		if "absolute_humidity" in quantities:
+			absolute_humidity = _numpy_to_array(vapour_pressure * 100 / (461.5 * (t + 273.15)) * 1000)
+
+	return AladinDerivedQuantities(
+		apparent_temperature=apparent_temperature,
+		dew_point=dew_point,
+		wind_chill=wind_chill,
+		heat_index=heat_index,
+		absolute_humidity=absolute_humidity,
+	)
+
+
+def _numpy_to_array(values) -> array:
+	result = array("d")
+	result.frombytes(values.astype(numpy.float64).tobytes())
+	return result
+
+
+def _compute_python(temperature: array, humidity: array, wind_speed: array, quantities: Collection[str]) -> AladinDerivedQuantities:
+	exp = math.exp
+	log = math.log
+
+	apparent_temperature = array("d") if "apparent_temperature" in quantities else None
+	dew_point = array("d") if "dew_point" in quantities else None
+	wind_chill = array("d") if "wind_chill" in quantities else None
+	heat_index = array("d") if "heat_index" in quantities else None
+	absolute_humidity = array("d") if "absolute_humidity" in quantities else None
+
+	# NaN compares as false, so missing values end up in the fallback branches as NaN
+	for t, rh, ws in zip(temperature, humidity, wind_speed):
+		magnus = 17.27 * t / (237.7 + t)
+		vapour_pressure = (rh / 100) * 6.105 * exp(magnus)
+
+		if apparent_temperature is not None:
+			apparent_temperature.append(t + 0.33 * vapour_pressure - 0.70 * ws - 4.00)
+
+		if dew_point is not None:
+			if rh > 0:
+				gamma = log(rh / 100) + magnus
+				dew_point.append(237.7 * gamma / (17.27 - gamma))
+			else:
+				dew_point.append(NAN)
+
+		if wind_chill is not None:
+			if t <= 10 and ws * 3.6 > 4.8:
+				wind_kmh_power = (ws * 3.6) ** 0.16
+				wind_chill.append(13.12 + 0.6215 * t - 11.37 * wind_kmh_power + 0.3965 * t * wind_kmh_power)
+			else:
+				wind_chill.append(t)
+
+		if heat_index is not None:
+			heat_index.append(_heat_index_rothfusz(t, rh) if t >= 26.7 else t)
+
+		if absolute_humidity is not None:
+			absolute_humidity.append(vapour_pressure * 100 / (461.5 * (t + 273.15)) * 1000)
+
+	return AladinDerivedQuantities(
+		apparent_temperature=apparent_temperature,
+		dew_point=dew_point,
+		wind_chill=wind_chill,
+		heat_index=heat_index,
+		absolute_humidity=absolute_humidity,
+	)
+
+
+def _heat_index_rothfusz(t, rh):
+	# Works for both floats and NumPy arrays
+	f = t * 1.8 + 32
+	heat_index = (
+		-42.379
+		+ 2.04901523 * f
+		+ 10.14333127 * rh
+		- 0.22475541 * f * rh
+		- 0.00683783 * f * f
+		- 0.05481717 * rh * rh
+		+ 0.00122874 * f * f * rh
+		+ 0.00085282 * f * rh * rh
+		- 0.00000199 * f * f * rh * rh
+	)
+	return (heat_index - 32) / 1.8
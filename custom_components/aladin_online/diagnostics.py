@@ -0,0 +1,93 @@
+from __future__ import annotations
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import (
+	CONF_LATITUDE,
+	CONF_LONGITUDE,
+)
+from homeassistant.core import HomeAssistant
+from . import AladinOnlineConfigEntry
+from .aladin_online import AladinOnlineLocation
+from .const import CONF_LOCATIONS, CONF_RADIUS
+from typing import Any, Dict
+
+TO_REDACT = {
+	CONF_LATITUDE,
+	CONF_LONGITUDE,
+}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, config_entry: AladinOnlineConfigEntry) -> Dict[str, Any]:
+	coordinator = config_entry.runtime_data
+
+	diagnostics = {
+		"config_entry": {
+			"data": async_redact_data(config_entry.data, TO_REDACT),
+			"options": dict(config_entry.options),
+		},
+		"last_update_success": coordinator.last_update_success,
+		"update_interval": coordinator.update_interval.total_seconds() if coordinator.update_interval is not None else None,
+		"fields": sorted(coordinator.fields),
+	}
+
+	if CONF_RADIUS in config_entry.data:
+		diagnostics["area"] = {
+			"points": coordinator.points,
+			"hours": len(coordinator.data.forecast) if coordinator.data is not None else None,
+		}
+
+	if CONF_LOCATIONS in config_entry.data or CONF_RADIUS in config_entry.data:
+		diagnostics["locations"] = {
+			name: await _async_location_diagnostics(coordinator.get_location(name))
+			for name in coordinator.location_names
+		}
+	else:
+		diagnostics.update(await _async_location_diagnostics(coordinator.get_location()))
+
+	return diagnostics
+
+
+async def _async_location_diagnostics(location: AladinOnlineLocation) -> Dict[str, Any]:
+	data_age = location.data_age
+	data_checked = location.data_checked
+
+	forecast = None
+	if location.weather is not None:
+		forecast = {
+			"hours": len(location.weather.forecast),
+			"actual_index": location.weather.actual_index,
+		}
+
+	return {
+		"data_checked": data_checked.isoformat() if data_checked is not None else None,
+		"data_age": data_age.total_seconds() if data_age is not None else None,
+		"forecast": forecast,
+		"fetch": location.fetch_stats.as_dict(),
+		"update": location.stats.as_dict(),
+		"archive": await _async_archive_diagnostics(location),
+	}
+
+
+async def _async_archive_diagnostics(location: AladinOnlineLocation) -> Dict[str, Any] | None:
+	if location.archive is None:
+		return None
+
+	try:
+		archive_skill = await location.archive.async_skill()
+	except (OSError, ValueError) as ex:
+		# An unreadable archive does not break the diagnostics, its skill is reported as unavailable
+		skill = None
+		skill_error = repr(ex)
+	else:
+		# Lead times in hours, in buckets of six
+		skill = {
+			column: {bucket: bucket_skill.as_dict() for bucket, bucket_skill in column_skill.items()}
+			for column, column_skill in archive_skill.items()
+		}
+		skill_error = None
+
+	return {
+		"runs": location.archive.runs,
+		"records": location.archive.records,
+		"skill": skill,
+		"skill_error": skill_error,
+	}
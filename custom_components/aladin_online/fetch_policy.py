@@ -0,0 +1,64 @@
+from __future__ import annotations
+from aiohttp import ClientTimeout
+from datetime import datetime, timedelta
+import hashlib
+import random
+from .const import (
+	DATA_MAX_STALENESS,
+	FAILURE_BACKOFF,
+	FAILURE_BACKOFF_MAX,
+	FETCH_CONNECT_TIMEOUT,
+	FETCH_MAX_BODY_SIZE,
+	FETCH_READ_TIMEOUT,
+	FETCH_RETRIES,
+	FETCH_RETRY_BACKOFF,
+	FETCH_RETRY_BACKOFF_MAX,
+	FETCH_TIMEOUT,
+	REFRESH_SPREAD_WINDOW,
+)
+
+
+class AladinOnlineFetchPolicy:
+	"""Retries, backoff and staleness limits of the meteogram downloads."""
+
+	def __init__(
+		self,
+		retries: int = FETCH_RETRIES,
+		retry_backoff: float = FETCH_RETRY_BACKOFF,
+		retry_backoff_max: float = FETCH_RETRY_BACKOFF_MAX,
+		failure_backoff: timedelta = FAILURE_BACKOFF,
+		failure_backoff_max: timedelta = FAILURE_BACKOFF_MAX,
+		max_staleness: timedelta = DATA_MAX_STALENESS,
+		timeout: ClientTimeout | None = None,
+		max_body_size: int = FETCH_MAX_BODY_SIZE,
+		refresh_spread: timedelta = REFRESH_SPREAD_WINDOW,
+	) -> None:
+		self.retries: int = retries
+		self.retry_backoff: float = retry_backoff
+		self.retry_backoff_max: float = retry_backoff_max
+		self.failure_backoff: timedelta = failure_backoff
+		self.failure_backoff_max: timedelta = failure_backoff_max
+		self.max_staleness: timedelta = max_staleness
+		self.timeout: ClientTimeout = timeout or ClientTimeout(
+			total=FETCH_TIMEOUT,
+			connect=FETCH_CONNECT_TIMEOUT,
+			sock_read=FETCH_READ_TIMEOUT,
+		)
+		self.max_body_size: int = max_body_size
+		self.refresh_spread: timedelta = refresh_spread
+
+	def retry_delay(self, attempt: int) -> float:
+		# Full jitter keeps retries of many locations from hitting CHMI at the same moment
+		return random.uniform(0, min(self.retry_backoff_max, self.retry_backoff * 2 ** attempt))
+
+	def failure_delay(self, failures: int) -> float:
+		delay = min(self.failure_backoff_max, self.failure_backoff * 2 ** max(failures - 1, 0)).total_seconds()
+		return random.uniform(delay / 2, delay)
+
+	def is_expired(self, data_checked: datetime | None, now: datetime) -> bool:
+		return data_checked is None or now - data_checked > self.max_staleness
+
+	def refresh_offset(self, key: str) -> timedelta:
+		# A stable hash gives every config entry the same slot after each restart, unlike hash() of the interpreter
+		digest = hashlib.sha1(key.encode()).digest()
+		return self.refresh_spread * (int.from_bytes(digest[:4], "big") / 2 ** 32)
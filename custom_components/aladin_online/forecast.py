@@ -0,0 +1,560 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from enum import StrEnum
+from homeassistant.components.weather import (
+	ATTR_CONDITION_CLEAR_NIGHT,
+	ATTR_CONDITION_CLOUDY,
+	ATTR_CONDITION_FOG,
+	ATTR_CONDITION_HAIL,
+	ATTR_CONDITION_LIGHTNING_RAINY,
+	ATTR_CONDITION_PARTLYCLOUDY,
+	ATTR_CONDITION_SNOWY,
+	ATTR_CONDITION_SNOWY_RAINY,
+	ATTR_CONDITION_SUNNY,
+	ATTR_CONDITION_RAINY,
+)
+from homeassistant.util import dt
+from .aggregation import aggregate_forecast, AladinForecastAggregates, half_day_period
+from .const import LOGGER
+from .derived import compute_derived_quantities
+from .errors import NoData
+from .lookahead import AladinForecastLookahead, build_lookahead
+from typing import Any, Collection, Dict, Final, FrozenSet, List, Tuple
+
+NAN: Final = float("nan")
+
+
+class AladinForecastField(StrEnum):
+	ABSOLUTE_HUMIDITY = "absolute_humidity"
+	APPARENT_TEMPERATURE = "apparent_temperature"
+	CLOUDS = "clouds"
+	DEW_POINT = "dew_point"
+	HEAT_INDEX = "heat_index"
+	HUMIDITY = "humidity"
+	PRECIPITATION = "precipitation"
+	PRESSURE = "pressure"
+	SNOW_PRECIPITATION = "snow_precipitation"
+	TEMPERATURE = "temperature"
+	WIND = "wind"
+	WIND_CHILL = "wind_chill"
+
+
+# Columns of the forecast filled for the fields
+FIELD_COLUMNS: Final[Dict[AladinForecastField, Tuple[str, ...]]] = {
+	AladinForecastField.ABSOLUTE_HUMIDITY: ("absolute_humidity",),
+	AladinForecastField.APPARENT_TEMPERATURE: ("apparent_temperature",),
+	AladinForecastField.CLOUDS: ("clouds",),
+	AladinForecastField.DEW_POINT: ("dew_point",),
+	AladinForecastField.HEAT_INDEX: ("heat_index",),
+	AladinForecastField.HUMIDITY: ("humidity",),
+	AladinForecastField.PRECIPITATION: ("precipitation",),
+	AladinForecastField.PRESSURE: ("pressure",),
+	AladinForecastField.SNOW_PRECIPITATION: ("snow_precipitation",),
+	AladinForecastField.TEMPERATURE: ("temperature",),
+	AladinForecastField.WIND: ("wind_speed", "wind_bearing", "wind_gust_speed"),
+	AladinForecastField.WIND_CHILL: ("wind_chill",),
+}
+
+# Meteogram keys of the columns that come from the data source, with the default for a missing key
+METEOGRAM_COLUMNS: Final[Dict[str, Tuple[str, float | None]]] = {
+	"temperature": ("t2m", None),
+	"precipitation": ("prec", 0),
+	"pressure": ("mslp", None),
+	"humidity": ("rh2m", None),
+	"clouds": ("cloudsTot", None),
+	"wind_speed": ("windSpeed", None),
+	"wind_bearing": ("windDirection", 0),
+	"wind_gust_speed": ("windGustSpeed", 0),
+	"snow_precipitation": ("snow", 0),
+}
+
+# Columns the derived quantities are computed from
+DERIVED_COLUMN_INPUTS: Final[Dict[str, Tuple[str, ...]]] = {
+	"apparent_temperature": ("temperature", "humidity", "wind_speed"),
+	"dew_point": ("temperature", "humidity"),
+	"wind_chill": ("temperature", "wind_speed"),
+	"heat_index": ("temperature", "humidity"),
+	"absolute_humidity": ("temperature", "humidity"),
+}
+
+# Mapping of CHMI numeric weather icons to Home Assistant conditions
+# Icon source: https://www.chmi.cz/predpoved-pocasi/ikony-pocasi
+ICON_CONDITION_MAP = {
+	# Daytime icons
+	10:  ATTR_CONDITION_SUNNY,           # Clear
+	20:  ATTR_CONDITION_SUNNY,           # Mostly clear
+	40:  ATTR_CONDITION_PARTLYCLOUDY,    # Partly cloudy
+	41:  ATTR_CONDITION_RAINY,           # Partly cloudy, shower
+	43:  ATTR_CONDITION_SNOWY_RAINY,     # Partly cloudy, sleet shower
+	45:  ATTR_CONDITION_SNOWY,           # Partly cloudy, snow shower
+	46:  ATTR_CONDITION_LIGHTNING_RAINY, # Partly cloudy, thunderstorm
+	60:  ATTR_CONDITION_PARTLYCLOUDY,    # Cloudy
+	61:  ATTR_CONDITION_RAINY,           # Cloudy, shower
+	62:  ATTR_CONDITION_SNOWY_RAINY,     # Cloudy, freezing rain
+	63:  ATTR_CONDITION_SNOWY_RAINY,     # Cloudy, sleet shower
+	64:  ATTR_CONDITION_SNOWY,           # Cloudy, snowfall
+	65:  ATTR_CONDITION_SNOWY,           # Cloudy, snow shower
+	66:  ATTR_CONDITION_LIGHTNING_RAINY, # Cloudy, thunderstorm
+	69:  ATTR_CONDITION_HAIL,            # Cloudy, hail
+	70:  ATTR_CONDITION_CLOUDY,          # Mostly overcast
+	71:  ATTR_CONDITION_RAINY,           # Mostly overcast, rain or shower
+	72:  ATTR_CONDITION_SNOWY_RAINY,     # Mostly overcast, freezing rain
+	73:  ATTR_CONDITION_SNOWY_RAINY,     # Mostly overcast, sleet
+	74:  ATTR_CONDITION_SNOWY,           # Mostly overcast, snowfall
+	75:  ATTR_CONDITION_SNOWY,           # Mostly overcast, snow shower
+	76:  ATTR_CONDITION_LIGHTNING_RAINY, # Mostly overcast, thunderstorm
+	79:  ATTR_CONDITION_HAIL,            # Mostly overcast, hail
+	80:  ATTR_CONDITION_CLOUDY,          # Overcast
+	81:  ATTR_CONDITION_RAINY,           # Overcast, rain or shower
+	82:  ATTR_CONDITION_SNOWY_RAINY,     # Overcast, freezing rain
+	83:  ATTR_CONDITION_SNOWY_RAINY,     # Overcast, sleet
+	84:  ATTR_CONDITION_SNOWY,           # Overcast, snowfall
+	85:  ATTR_CONDITION_SNOWY,           # Overcast, snow shower
+	86:  ATTR_CONDITION_LIGHTNING_RAINY, # Overcast, thunderstorm
+	89:  ATTR_CONDITION_HAIL,            # Overcast, hail
+	90:  ATTR_CONDITION_FOG,             # Fog
+	91:  ATTR_CONDITION_FOG,             # Fog, shower
+	92:  ATTR_CONDITION_FOG,             # Fog, freezing rain
+	93:  ATTR_CONDITION_FOG,             # Fog, sleet
+	94:  ATTR_CONDITION_FOG,             # Fog, snowfall
+	# Nighttime icons
+	110: ATTR_CONDITION_CLEAR_NIGHT,     # Clear
+	120: ATTR_CONDITION_CLEAR_NIGHT,     # Mostly clear
+	140: ATTR_CONDITION_PARTLYCLOUDY,    # Partly cloudy
+	141: ATTR_CONDITION_RAINY,           # Partly cloudy, shower
+	143: ATTR_CONDITION_SNOWY_RAINY,     # Partly cloudy, sleet shower
+	145: ATTR_CONDITION_SNOWY,           # Partly cloudy, snow shower
+	146: ATTR_CONDITION_LIGHTNING_RAINY, # Partly cloudy, thunderstorm
+	160: ATTR_CONDITION_PARTLYCLOUDY,    # Cloudy
+	161: ATTR_CONDITION_RAINY,           # Cloudy, shower
+	162: ATTR_CONDITION_SNOWY_RAINY,     # Cloudy, freezing rain
+	163: ATTR_CONDITION_SNOWY_RAINY,     # Cloudy, sleet shower
+	164: ATTR_CONDITION_SNOWY,           # Cloudy, snowfall
+	165: ATTR_CONDITION_SNOWY,           # Cloudy, snow shower
+	166: ATTR_CONDITION_LIGHTNING_RAINY, # Cloudy, thunderstorm
+	169: ATTR_CONDITION_HAIL,            # Cloudy, hail
+	170: ATTR_CONDITION_CLOUDY,          # Mostly overcast
+	171: ATTR_CONDITION_RAINY,           # Mostly overcast, rain or shower
+	172: ATTR_CONDITION_SNOWY_RAINY,     # Mostly overcast, freezing rain
+	173: ATTR_CONDITION_SNOWY_RAINY,     # Mostly overcast, sleet
+	174: ATTR_CONDITION_SNOWY,           # Mostly overcast, snowfall
+	175: ATTR_CONDITION_SNOWY,           # Mostly overcast, snow shower
+	176: ATTR_CONDITION_LIGHTNING_RAINY, # Mostly overcast, thunderstorm
+	179: ATTR_CONDITION_HAIL,            # Mostly overcast, hail
+}
+
+# Weather icons of the hours with a thunderstorm
+THUNDERSTORM_ICONS: Final[FrozenSet[int]] = frozenset(
+	icon for icon, condition in ICON_CONDITION_MAP.items() if condition == ATTR_CONDITION_LIGHTNING_RAINY
+)
+
+
+class AladinActualWeather:
+
+	__slots__ = (
+		"condition",
+		"temperature",
+		"apparent_temperature",
+		"precipitation",
+		"pressure",
+		"humidity",
+		"clouds",
+		"wind_speed",
+		"wind_bearing",
+		"wind_gust_speed",
+		"wind_gust_bearing",
+		"snow_precipitation",
+		"dew_point",
+		"wind_chill",
+		"heat_index",
+		"absolute_humidity",
+	)
+
+	def __init__(
+		self,
+		condition: str,
+		temperature: float | None,
+		apparent_temperature: float | None,
+		precipitation: float | None,
+		pressure: float | None,
+		humidity: float | None,
+		clouds: float | None,
+		wind_speed: float | None,
+		wind_bearing: float | None,
+		wind_gust_speed: float | None,
+		wind_gust_bearing: float | None,
+		snow_precipitation: float | None,
+		dew_point: float | None,
+		wind_chill: float | None,
+		heat_index: float | None,
+		absolute_humidity: float | None,
+	) -> None:
+		self.condition = condition
+		self.temperature = temperature
+		self.apparent_temperature = apparent_temperature
+		self.precipitation = precipitation
+		self.pressure = pressure
+		self.humidity = humidity
+		self.clouds = clouds
+		self.wind_speed = wind_speed
+		self.wind_bearing = wind_bearing
+		self.wind_gust_speed = wind_gust_speed
+		self.wind_gust_bearing = wind_gust_bearing
+		self.snow_precipitation = snow_precipitation
+		self.dew_point = dew_point
+		self.wind_chill = wind_chill
+		self.heat_index = heat_index
+		self.absolute_humidity = absolute_humidity
+
+
+class AladinForecast:
+	"""Meteogram parsed into parallel columns with one item per hour.
+
+	Numeric columns are arrays of doubles with NaN for missing values, weather icons are kept as numbers.
+	Columns of the fields that were not selected are None.
+
+	A parsed forecast is immutable, its columns are read-only views, so it can be built in the executor
+	and shared with the event loop without copies.
+	"""
+
+	__slots__ = (
+		"timestamps",
+		"icon",
+		"temperature",
+		"apparent_temperature",
+		"precipitation",
+		"pressure",
+		"humidity",
+		"clouds",
+		"wind_speed",
+		"wind_bearing",
+		"wind_gust_speed",
+		"snow_precipitation",
+		"dew_point",
+		"wind_chill",
+		"heat_index",
+		"absolute_humidity",
+		"_aggregates",
+		"_lookahead",
+		"_frozen",
+	)
+
+	def __init__(self) -> None:
+		self._aggregates: AladinForecastAggregates | None = None
+		self._lookahead: AladinForecastLookahead | None = None
+		self.timestamps: array = array("d")
+		self.icon: array = array("H")
+		self.temperature: array | None = None
+		self.apparent_temperature: array | None = None
+		self.precipitation: array | None = None
+		self.pressure: array | None = None
+		self.humidity: array | None = None
+		self.clouds: array | None = None
+		self.wind_speed: array | None = None
+		self.wind_bearing: array | None = None
+		self.wind_gust_speed: array | None = None
+		self.snow_precipitation: array | None = None
+		self.dew_point: array | None = None
+		self.wind_chill: array | None = None
+		self.heat_index: array | None = None
+		self.absolute_humidity: array | None = None
+
+	def __len__(self) -> int:
+		return len(self.timestamps)
+
+	def __setattr__(self, name: str, value: Any) -> None:
+		if getattr(self, "_frozen", False):
+			raise AttributeError("Parsed forecast is immutable")
+
+		object.__setattr__(self, name, value)
+
+	@property
+	def aggregates(self) -> AladinForecastAggregates:
+		# Computed with the forecast, once per parsed meteogram
+		return self._aggregates
+
+	@property
+	def lookahead(self) -> AladinForecastLookahead:
+		return self._lookahead
+
+	def index_at(self, moment: datetime) -> int:
+		# The last hour that already started, or the first one when the forecast starts in the future
+		return max(bisect_right(self.timestamps, moment.timestamp()) - 1, 0)
+
+	def index_after(self, moment: datetime) -> int:
+		return bisect_right(self.timestamps, moment.timestamp())
+
+	def condition(self, index: int) -> str:
+		return ICON_CONDITION_MAP.get(self.icon[index], ATTR_CONDITION_SUNNY)
+
+	def row(self, index: int) -> AladinWeatherForecast:
+		return AladinWeatherForecast(self, index)
+
+	def actual_weather(self, index: int) -> AladinActualWeather:
+		row = self.row(index)
+
+		return AladinActualWeather(
+			condition=row.condition,
+			temperature=row.temperature,
+			apparent_temperature=row.apparent_temperature,
+			precipitation=row.precipitation,
+			pressure=row.pressure,
+			humidity=row.humidity,
+			clouds=row.clouds,
+			wind_speed=row.wind_speed,
+			wind_bearing=row.wind_bearing,
+			wind_gust_speed=row.wind_gust_speed,
+			wind_gust_bearing=row.wind_bearing,
+			snow_precipitation=row.snow_precipitation,
+			dew_point=row.dew_point,
+			wind_chill=row.wind_chill,
+			heat_index=row.heat_index,
+			absolute_humidity=row.absolute_humidity,
+		)
+
+	def interpolated_weather(self, moment: datetime) -> AladinActualWeather:
+		index = self.index_at(moment)
+		next_index = index + 1
+		timestamp = moment.timestamp()
+
+		if next_index >= len(self) or timestamp <= self.timestamps[index]:
+			return self.actual_weather(index)
+
+		fraction = (timestamp - self.timestamps[index]) / (self.timestamps[next_index] - self.timestamps[index])
+
+		def interpolate(column: array | None) -> float | None:
+			if column is None:
+				return None
+
+			value = column[index] + (column[next_index] - column[index]) * fraction
+			return None if value != value else value
+
+		wind_bearing = None
+		if self.wind_bearing is not None:
+			# Wind direction goes the shorter way around the circle
+			bearing_difference = (self.wind_bearing[next_index] - self.wind_bearing[index] + 180) % 360 - 180
+			wind_bearing = (self.wind_bearing[index] + bearing_difference * fraction) % 360
+			# A missing bearing on either side gives NaN, like the other columns it is published as None
+			if wind_bearing != wind_bearing:
+				wind_bearing = None
+
+		return AladinActualWeather(
+			condition=self.condition(index),
+			temperature=interpolate(self.temperature),
+			apparent_temperature=interpolate(self.apparent_temperature),
+			precipitation=interpolate(self.precipitation),
+			pressure=interpolate(self.pressure),
+			humidity=interpolate(self.humidity),
+			clouds=interpolate(self.clouds),
+			wind_speed=interpolate(self.wind_speed),
+			wind_bearing=wind_bearing,
+			wind_gust_speed=interpolate(self.wind_gust_speed),
+			wind_gust_bearing=wind_bearing,
+			snow_precipitation=interpolate(self.snow_precipitation),
+			dew_point=interpolate(self.dew_point),
+			wind_chill=interpolate(self.wind_chill),
+			heat_index=interpolate(self.heat_index),
+			absolute_humidity=interpolate(self.absolute_humidity),
+		)
+
+	@staticmethod
+	def from_meteogram(
+		data: Dict[str, Any],
+		fields: Collection[AladinForecastField] | None = None,
+		horizon_end: datetime | None = None,
+	) -> AladinForecast:
+		entries = data.get("data", [])
+		if not entries:
+			raise NoData
+
+		if fields is None:
+			fields = AladinForecastField
+
+		columns = {column for field in fields for column in FIELD_COLUMNS[field]}
+		derived_columns = [column for column in DERIVED_COLUMN_INPUTS if column in columns]
+		# Inputs of the derived quantities are parsed even when their own fields are not selected
+		parsed_columns = columns.union(*(DERIVED_COLUMN_INPUTS[column] for column in derived_columns))
+
+		forecast = AladinForecast()
+		horizon_timestamp = horizon_end.timestamp() if horizon_end is not None else None
+
+		# Only the selected values are read from the entries
+		extractors = []
+		for column, (key, default) in METEOGRAM_COLUMNS.items():
+			if column in parsed_columns:
+				values = array("d")
+				setattr(forecast, column, values)
+				extractors.append((values.append, key, default))
+
+		for entry in entries:
+			timestamp = dt.parse_datetime(entry["validityTime"]).timestamp()
+			if horizon_timestamp is not None and timestamp > horizon_timestamp:
+				break
+
+			icon = entry.get("icon", 0)
+			if icon not in ICON_CONDITION_MAP:
+				LOGGER.warning("Unknown weather icon: {}".format(icon))
+				icon = AladinForecast.format_icon(icon)
+
+			forecast.timestamps.append(timestamp)
+			forecast.icon.append(icon)
+
+			for append, key, default in extractors:
+				append(AladinForecast.format_value(entry.get(key, default)))
+
+		if forecast.wind_bearing is not None:
+			forecast.wind_bearing = array("d", map(AladinForecast._format_wind_direction, forecast.wind_bearing))
+
+		if derived_columns:
+			missing = array("d", [NAN]) * len(forecast)
+			derived = compute_derived_quantities(
+				forecast.temperature if forecast.temperature is not None else missing,
+				forecast.humidity if forecast.humidity is not None else missing,
+				forecast.wind_speed if forecast.wind_speed is not None else missing,
+				derived_columns,
+			)
+			for column in derived_columns:
+				setattr(forecast, column, getattr(derived, column))
+
+		# Inputs that are not exposed are not kept
+		for column in parsed_columns - columns:
+			setattr(forecast, column, None)
+
+		if forecast.wind_speed is not None:
+			# Missing wind speed counts as calm, but it must not produce apparent temperature
+			for i, wind_speed in enumerate(forecast.wind_speed):
+				if wind_speed != wind_speed:
+					forecast.wind_speed[i] = 0
+
+		forecast._aggregates = aggregate_forecast(forecast)
+		forecast._lookahead = build_lookahead(forecast)
+		forecast._freeze()
+
+		return forecast
+
+	def _freeze(self) -> None:
+		for column in AladinForecast.__slots__:
+			value = getattr(self, column, None)
+			if isinstance(value, array):
+				object.__setattr__(self, column, memoryview(value).toreadonly())
+
+		object.__setattr__(self, "_frozen", True)
+
+	@staticmethod
+	def format_value(raw: Any) -> float:
+		# Missing and non-numeric values are stored as NaN, the archive cleans its records the same way
+		if isinstance(raw, (int, float)) and not isinstance(raw, bool):
+			return raw
+
+		return NAN
+
+	@staticmethod
+	def format_icon(raw: Any) -> int:
+		# The icon column holds unsigned 16-bit numbers, anything else falls back to the default condition
+		if isinstance(raw, int) and not isinstance(raw, bool) and 0 <= raw <= 0xFFFF:
+			return raw
+
+		return 0
+
+	@staticmethod
+	def _format_wind_direction(raw: float) -> float:
+		return raw % 360
+
+
+class _ColumnValue:
+	"""Value of a forecast column in the row of the view."""
+
+	__slots__ = ("_column",)
+
+	def __set_name__(self, owner: type, name: str) -> None:
+		self._column = name
+
+	def __get__(self, row: AladinWeatherForecast | None, owner: type | None = None):
+		if row is None:
+			return self
+
+		column = getattr(row.forecast, self._column)
+		if column is None:
+			return None
+
+		value = column[row.index]
+		return None if value != value else value
+
+
+class AladinWeatherForecast:
+	"""Lazy view of one hour of the forecast."""
+
+	__slots__ = ("forecast", "index")
+
+	temperature = _ColumnValue()
+	apparent_temperature = _ColumnValue()
+	precipitation = _ColumnValue()
+	pressure = _ColumnValue()
+	humidity = _ColumnValue()
+	clouds = _ColumnValue()
+	wind_speed = _ColumnValue()
+	wind_bearing = _ColumnValue()
+	wind_gust_speed = _ColumnValue()
+	snow_precipitation = _ColumnValue()
+	dew_point = _ColumnValue()
+	wind_chill = _ColumnValue()
+	heat_index = _ColumnValue()
+	absolute_humidity = _ColumnValue()
+
+	def __init__(self, forecast: AladinForecast, index: int) -> None:
+		self.forecast: AladinForecast = forecast
+		self.index: int = index
+
+	@property
+	def timestamp(self) -> float:
+		return self.forecast.timestamps[self.index]
+
+	@property
+	def datetime(self) -> datetime:
+		return dt.utc_from_timestamp(self.forecast.timestamps[self.index])
+
+	@property
+	def condition(self) -> str:
+		return self.forecast.condition(self.index)
+
+
+class AladinWeather:
+
+	__slots__ = ("forecast", "actual_index", "actual_weather")
+
+	def __init__(self, forecast: AladinForecast, actual_index: int, actual_weather: AladinActualWeather | None = None) -> None:
+		self.forecast: AladinForecast = forecast
+		self.actual_index: int = actual_index
+		self.actual_weather: AladinActualWeather = actual_weather if actual_weather is not None else forecast.actual_weather(actual_index)
+
+	@property
+	def hourly_forecasts(self) -> List[AladinWeatherForecast]:
+		return [self.forecast.row(i) for i in range(self.actual_index + 1, len(self.forecast))]
+
+	def precipitation_total(self, hours: int) -> float | None:
+		# The current hour is included
+		return self.forecast.lookahead.precipitation_total(self.actual_index, self.actual_index + hours)
+
+	def next_precipitation(self) -> datetime | None:
+		index = self.forecast.lookahead.next_precipitation(self.actual_index)
+		return None if index is None else dt.utc_from_timestamp(self.forecast.timestamps[index])
+
+	def wind_gust_speed_max(self, hours: int) -> float | None:
+		return self.forecast.lookahead.wind_gust_speed_max(self.actual_index, self.actual_index + hours)
+
+	def temperature_min_tonight(self) -> float | None:
+		# The night that is running, or the next one during the day
+		period = half_day_period(dt.as_local(dt.utc_from_timestamp(self.forecast.timestamps[self.actual_index])))
+		if period.is_daytime:
+			period = half_day_period(period.end)
+
+		# The forecast must cover the whole night, e.g. a short horizon can end before the morning
+		if dt.utc_from_timestamp(self.forecast.timestamps[-1]) + timedelta(hours=1) < period.end:
+			return None
+
+		start = max(bisect_left(self.forecast.timestamps, period.start.timestamp()), self.actual_index)
+		end = bisect_left(self.forecast.timestamps, period.end.timestamp())
+
+		return self.forecast.lookahead.temperature_min(start, end)
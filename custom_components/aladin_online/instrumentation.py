@@ -0,0 +1,103 @@
+from __future__ import annotations
+from typing import Any, Dict
+
+
+class AladinOnlineTiming:
+	"""Durations of one stage of the refresh, in seconds."""
+
+	__slots__ = ("count", "last", "total", "max")
+
+	def __init__(self) -> None:
+		self.count: int = 0
+		self.last: float | None = None
+		self.total: float = 0
+		self.max: float = 0
+
+	@property
+	def average(self) -> float | None:
+		return self.total / self.count if self.count > 0 else None
+
+	def record(self, duration: float) -> None:
+		self.count += 1
+		self.last = duration
+		self.total += duration
+		if duration > self.max:
+			self.max = duration
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {
+			"count": self.count,
+			"last": self.last,
+			"average": self.average,
+			"max": self.max,
+		}
+
+
+class AladinOnlineFetchStats:
+	"""Downloads of one location, shared by all its coordinators."""
+
+	__slots__ = (
+		"fetch",
+		"decode",
+		"requests",
+		"not_modified",
+		"failed_requests",
+		"failed_refreshes",
+		"payload_size",
+		"hits",
+		"stale_hits",
+		"misses",
+	)
+
+	def __init__(self) -> None:
+		self.fetch: AladinOnlineTiming = AladinOnlineTiming()
+		self.decode: AladinOnlineTiming = AladinOnlineTiming()
+		self.requests: int = 0
+		self.not_modified: int = 0
+		self.failed_requests: int = 0
+		self.failed_refreshes: int = 0
+		self.payload_size: int | None = None
+		# Reads of the cache: fresh data, data served while revalidating, and reads that waited for a download
+		self.hits: int = 0
+		self.stale_hits: int = 0
+		self.misses: int = 0
+
+	@property
+	def hit_rate(self) -> float | None:
+		reads = self.hits + self.stale_hits + self.misses
+		return (self.hits + self.stale_hits) / reads if reads > 0 else None
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {
+			"fetch": self.fetch.as_dict(),
+			"decode": self.decode.as_dict(),
+			"requests": self.requests,
+			"not_modified": self.not_modified,
+			"failed_requests": self.failed_requests,
+			"failed_refreshes": self.failed_refreshes,
+			"payload_size": self.payload_size,
+			"hits": self.hits,
+			"stale_hits": self.stale_hits,
+			"misses": self.misses,
+			"hit_rate": self.hit_rate,
+		}
+
+
+class AladinOnlineUpdateStats:
+	"""Work of one coordinator after the meteogram is available."""
+
+	__slots__ = ("update", "parse", "publish", "parse_skipped")
+
+	def __init__(self) -> None:
+		self.update: AladinOnlineTiming = AladinOnlineTiming()
+		self.parse: AladinOnlineTiming = AladinOnlineTiming()
+		self.publish: AladinOnlineTiming = AladinOnlineTiming()
+		self.parse_skipped: int = 0
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {
+			"update": self.update.as_dict(),
+			"parse": self.parse.as_dict(),
+			"publish": self.publish.as_dict(),
+			"parse_skipped": self.parse_skipped,
+		}
@@ -0,0 +1,125 @@
+from __future__ import annotations
+from array import array
+from typing import Callable, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+	from .forecast import AladinForecast
+
+# Hourly precipitation (mm) from which an hour counts as rainy
+PRECIPITATION_THRESHOLD = 0.1
+
+NAN = float("nan")
+
+
+class AladinRangeQuery:
+	"""Sparse table answering the minimum or maximum of any range of hours in constant time.
+
+	Level k holds the result of the 2^k hours starting at each index, a range is covered by two overlapping blocks.
+	Missing values (NaN) are skipped, a range of missing values gives None.
+	"""
+
+	__slots__ = ("_levels", "_function")
+
+	def __init__(self, values: array, function: Callable[[float, float], float]) -> None:
+		self._function: Callable[[float, float], float] = function
+		self._levels: List[array] = [array("d", values)]
+
+		width = 1
+		while width * 2 <= len(values):
+			previous = self._levels[-1]
+			self._levels.append(array("d", (
+				AladinRangeQuery._combine(function, previous[i], previous[i + width])
+				for i in range(len(previous) - width)
+			)))
+			width *= 2
+
+	def query(self, start: int, end: int) -> float | None:
+		# A range reaching past the data would be answered only in part
+		if start >= end or end > len(self._levels[0]):
+			return None
+
+		level = (end - start).bit_length() - 1
+		values = self._levels[level]
+		value = AladinRangeQuery._combine(self._function, values[start], values[end - (1 << level)])
+
+		return None if value != value else value
+
+	@staticmethod
+	def _combine(function: Callable[[float, float], float], first: float, second: float) -> float:
+		# NaN fails every comparison, so a missing value gives way to the other one
+		if first != first:
+			return second
+		if second != second:
+			return first
+
+		return function(first, second)
+
+
+class AladinForecastLookahead:
+	"""Answers about the hours ahead, prepared in one pass over the columns per parsed meteogram."""
+
+	__slots__ = ("_precipitation_sums", "_next_precipitation", "_temperature", "_wind_gust_speed")
+
+	def __init__(
+		self,
+		precipitation_sums: array | None,
+		next_precipitation: array | None,
+		temperature: AladinRangeQuery | None,
+		wind_gust_speed: AladinRangeQuery | None,
+	) -> None:
+		self._precipitation_sums: array | None = precipitation_sums
+		self._next_precipitation: array | None = next_precipitation
+		self._temperature: AladinRangeQuery | None = temperature
+		self._wind_gust_speed: AladinRangeQuery | None = wind_gust_speed
+
+	def precipitation_total(self, start: int, end: int) -> float | None:
+		if self._precipitation_sums is None:
+			return None
+
+		# A total of a part of the window would look like the total of all of it, e.g. with a short horizon
+		if start >= end or end >= len(self._precipitation_sums):
+			return None
+
+		return self._precipitation_sums[end] - self._precipitation_sums[start]
+
+	def next_precipitation(self, start: int) -> int | None:
+		if self._next_precipitation is None or start >= len(self._next_precipitation):
+			return None
+
+		index = self._next_precipitation[start]
+		return None if index < 0 else index
+
+	def temperature_min(self, start: int, end: int) -> float | None:
+		return self._temperature.query(start, end) if self._temperature is not None else None
+
+	def wind_gust_speed_max(self, start: int, end: int) -> float | None:
+		return self._wind_gust_speed.query(start, end) if self._wind_gust_speed is not None else None
+
+
+def build_lookahead(forecast: AladinForecast) -> AladinForecastLookahead:
+	precipitation_sums = None
+	next_precipitation = None
+
+	if forecast.precipitation is not None:
+		# Prefix sums: the total of hours [start, end) is sums[end] - sums[start], missing hours count as dry
+		precipitation_sums = array("d", [0])
+		total = 0
+		for precipitation in forecast.precipitation:
+			if precipitation == precipitation:
+				total += precipitation
+			precipitation_sums.append(total)
+
+		# The first rainy hour at or after each hour, -1 when there is none, filled from the end
+		next_precipitation = array("l", [-1]) * len(forecast)
+		following = -1
+		for i in range(len(forecast) - 1, -1, -1):
+			if forecast.precipitation[i] >= PRECIPITATION_THRESHOLD:
+				following = i
+			next_precipitation[i] = following
+
+	return AladinForecastLookahead(
+		precipitation_sums,
+		next_precipitation,
+		AladinRangeQuery(forecast.temperature, min) if forecast.temperature is not None else None,
+		AladinRangeQuery(forecast.wind_gust_speed, max) if forecast.wind_gust_speed is not None else None,
+	)
@@ -3,10 +3,14 @@ from collections.abc import Callable
 from dataclasses import dataclass
 from enum import StrEnum
 from homeassistant.const import (
+	EntityCategory,
 	PERCENTAGE,
+	UnitOfInformation,
+	UnitOfPrecipitationDepth,
 	UnitOfPressure,
 	UnitOfSpeed,
 	UnitOfTemperature,
+	UnitOfTime,
 	UnitOfVolumetricFlux,
 )
 from homeassistant.components.sensor import (
@@ -23,114 +27,396 @@ from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.update_coordinator import CoordinatorEntity, DataUpdateCoordinator
 from homeassistant.helpers.device_registry import DeviceEntryType
 from types import MappingProxyType
-from typing import Dict
+from typing import Any, Dict
 from . import AladinOnlineConfigEntry
-from .aladin_online import AladinActualWeather
+from .area import AladinAreaWeather
+from .forecast import AladinForecastField, AladinWeather
 from .const import (
+	CONF_DEADBAND,
+	CONF_LOCATIONS,
+	CONF_RADIUS,
 	DOMAIN,
 	NAME,
 )
 
+# Not in homeassistant.const of the supported Home Assistant versions
+CONCENTRATION_GRAMS_PER_CUBIC_METER = "g/m³"
+
 
 class SensorType(StrEnum):
+	ABSOLUTE_HUMIDITY = "absolute_humidity"
 	APPARENT_TEMPERATURE = "apparent_temperature"
 	CLOUDS = "clouds"
+	DEW_POINT = "dew_point"
+	HEAT_INDEX = "heat_index"
 	HUMIDITY = "humidity"
 	PRECIPITATION = "precipitation"
 	PRESSURE = "pressure"
 	SNOW_PRECIPITATION = "snow_precipitation"
 	TEMPERATURE = "temperature"
+	WIND_CHILL = "wind_chill"
 	WIND_SPEED = "wind_speed"
 	WIND_GUST_SPEED = "wind_gust_speed"
+	NEXT_PRECIPITATION = "next_precipitation"
+	PRECIPITATION_3H = "precipitation_3h"
+	PRECIPITATION_6H = "precipitation_6h"
+	PRECIPITATION_12H = "precipitation_12h"
+	PRECIPITATION_24H = "precipitation_24h"
+	TEMPERATURE_MIN_TONIGHT = "temperature_min_tonight"
+	WIND_GUST_SPEED_MAX_12H = "wind_gust_speed_max_12h"
+
+
+class AreaSensorType(StrEnum):
+	AREA_PRECIPITATION_MAX = "area_precipitation_max"
+	AREA_WIND_GUST_SPEED_MAX = "area_wind_gust_speed_max"
+	AREA_THUNDERSTORM_FRACTION = "area_thunderstorm_fraction"
+	AREA_THUNDERSTORM_FRACTION_MAX_3H = "area_thunderstorm_fraction_max_3h"
+
+
+class DiagnosticSensorType(StrEnum):
+	DATA_CHECKED = "data_checked"
+	FAILED_REFRESHES = "failed_refreshes"
+	FETCH_DURATION = "fetch_duration"
+	PARSE_DURATION = "parse_duration"
+	PAYLOAD_SIZE = "payload_size"
+	UPDATE_DURATION = "update_duration"
 
 
 @dataclass(frozen=True, kw_only=True)
 class SensorEntityDescription(ComponentSensorEntityDescription):
+	field: AladinForecastField | None = None
 	value_func: Callable | None = None
+	# The state is written only when the value moves at least by the deadband
+	deadband: float = 0
 
 
 SENSORS: Dict[SensorType, SensorEntityDescription] = {
+	SensorType.ABSOLUTE_HUMIDITY: SensorEntityDescription(
+		key=SensorType.ABSOLUTE_HUMIDITY,
+		field=AladinForecastField.ABSOLUTE_HUMIDITY,
+		icon="mdi:water",
+		native_unit_of_measurement=CONCENTRATION_GRAMS_PER_CUBIC_METER,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.absolute_humidity,
+	),
 	SensorType.APPARENT_TEMPERATURE: SensorEntityDescription(
 		key=SensorType.APPARENT_TEMPERATURE,
+		field=AladinForecastField.APPARENT_TEMPERATURE,
 		device_class=SensorDeviceClass.TEMPERATURE,
 		native_unit_of_measurement=UnitOfTemperature.CELSIUS,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.apparent_temperature,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.apparent_temperature,
 	),
 	SensorType.CLOUDS: SensorEntityDescription(
 		key=SensorType.CLOUDS,
+		field=AladinForecastField.CLOUDS,
 		icon="mdi:weather-partly-cloudy",
 		native_unit_of_measurement=PERCENTAGE,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.clouds,
+		deadband=1,
+		value_func=lambda weather: weather.actual_weather.clouds,
+	),
+	SensorType.DEW_POINT: SensorEntityDescription(
+		key=SensorType.DEW_POINT,
+		field=AladinForecastField.DEW_POINT,
+		device_class=SensorDeviceClass.TEMPERATURE,
+		native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.dew_point,
+	),
+	SensorType.HEAT_INDEX: SensorEntityDescription(
+		key=SensorType.HEAT_INDEX,
+		field=AladinForecastField.HEAT_INDEX,
+		device_class=SensorDeviceClass.TEMPERATURE,
+		native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.heat_index,
 	),
 	SensorType.HUMIDITY: SensorEntityDescription(
 		key=SensorType.HUMIDITY,
+		field=AladinForecastField.HUMIDITY,
 		device_class=SensorDeviceClass.HUMIDITY,
 		native_unit_of_measurement=PERCENTAGE,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.humidity,
+		deadband=0.5,
+		value_func=lambda weather: weather.actual_weather.humidity,
 	),
 	SensorType.PRECIPITATION: SensorEntityDescription(
 		key=SensorType.PRECIPITATION,
+		field=AladinForecastField.PRECIPITATION,
 		device_class=SensorDeviceClass.PRECIPITATION_INTENSITY,
 		native_unit_of_measurement=UnitOfVolumetricFlux.MILLIMETERS_PER_HOUR,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.precipitation,
+		value_func=lambda weather: weather.actual_weather.precipitation,
 	),
 	SensorType.PRESSURE: SensorEntityDescription(
 		key=SensorType.PRESSURE,
+		field=AladinForecastField.PRESSURE,
 		device_class=SensorDeviceClass.ATMOSPHERIC_PRESSURE,
 		native_unit_of_measurement=UnitOfPressure.HPA,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.pressure,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.pressure,
 	),
 	SensorType.SNOW_PRECIPITATION: SensorEntityDescription(
 		key=SensorType.SNOW_PRECIPITATION,
+		field=AladinForecastField.SNOW_PRECIPITATION,
 		icon="mdi:weather-snowy",
 		native_unit_of_measurement=PERCENTAGE,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.snow_precipitation,
+		value_func=lambda weather: weather.actual_weather.snow_precipitation,
 	),
 	SensorType.TEMPERATURE: SensorEntityDescription(
 		key=SensorType.TEMPERATURE,
+		field=AladinForecastField.TEMPERATURE,
+		device_class=SensorDeviceClass.TEMPERATURE,
+		native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.temperature,
+	),
+	SensorType.WIND_CHILL: SensorEntityDescription(
+		key=SensorType.WIND_CHILL,
+		field=AladinForecastField.WIND_CHILL,
 		device_class=SensorDeviceClass.TEMPERATURE,
 		native_unit_of_measurement=UnitOfTemperature.CELSIUS,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.temperature,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.wind_chill,
 	),
 	SensorType.WIND_SPEED: SensorEntityDescription(
 		key=SensorType.WIND_SPEED,
+		field=AladinForecastField.WIND,
 		device_class=SensorDeviceClass.WIND_SPEED,
 		native_unit_of_measurement=UnitOfSpeed.METERS_PER_SECOND,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.wind_speed,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.wind_speed,
 	),
 	SensorType.WIND_GUST_SPEED: SensorEntityDescription(
 		key=SensorType.WIND_GUST_SPEED,
+		field=AladinForecastField.WIND,
+		device_class=SensorDeviceClass.WIND_SPEED,
+		native_unit_of_measurement=UnitOfSpeed.METERS_PER_SECOND,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		deadband=0.1,
+		value_func=lambda weather: weather.actual_weather.wind_gust_speed,
+	),
+	# Lookahead sensors answer from the structures prepared with the forecast, without a pass over the hours
+	SensorType.NEXT_PRECIPITATION: SensorEntityDescription(
+		key=SensorType.NEXT_PRECIPITATION,
+		field=AladinForecastField.PRECIPITATION,
+		device_class=SensorDeviceClass.TIMESTAMP,
+		icon="mdi:weather-rainy",
+		value_func=lambda weather: weather.next_precipitation(),
+	),
+	SensorType.PRECIPITATION_3H: SensorEntityDescription(
+		key=SensorType.PRECIPITATION_3H,
+		field=AladinForecastField.PRECIPITATION,
+		device_class=SensorDeviceClass.PRECIPITATION,
+		native_unit_of_measurement=UnitOfPrecipitationDepth.MILLIMETERS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		value_func=lambda weather: weather.precipitation_total(3),
+	),
+	SensorType.PRECIPITATION_6H: SensorEntityDescription(
+		key=SensorType.PRECIPITATION_6H,
+		field=AladinForecastField.PRECIPITATION,
+		device_class=SensorDeviceClass.PRECIPITATION,
+		native_unit_of_measurement=UnitOfPrecipitationDepth.MILLIMETERS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		value_func=lambda weather: weather.precipitation_total(6),
+	),
+	SensorType.PRECIPITATION_12H: SensorEntityDescription(
+		key=SensorType.PRECIPITATION_12H,
+		field=AladinForecastField.PRECIPITATION,
+		device_class=SensorDeviceClass.PRECIPITATION,
+		native_unit_of_measurement=UnitOfPrecipitationDepth.MILLIMETERS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		value_func=lambda weather: weather.precipitation_total(12),
+	),
+	SensorType.PRECIPITATION_24H: SensorEntityDescription(
+		key=SensorType.PRECIPITATION_24H,
+		field=AladinForecastField.PRECIPITATION,
+		device_class=SensorDeviceClass.PRECIPITATION,
+		native_unit_of_measurement=UnitOfPrecipitationDepth.MILLIMETERS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		value_func=lambda weather: weather.precipitation_total(24),
+	),
+	SensorType.TEMPERATURE_MIN_TONIGHT: SensorEntityDescription(
+		key=SensorType.TEMPERATURE_MIN_TONIGHT,
+		field=AladinForecastField.TEMPERATURE,
+		device_class=SensorDeviceClass.TEMPERATURE,
+		native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		deadband=0.1,
+		value_func=lambda weather: weather.temperature_min_tonight(),
+	),
+	SensorType.WIND_GUST_SPEED_MAX_12H: SensorEntityDescription(
+		key=SensorType.WIND_GUST_SPEED_MAX_12H,
+		field=AladinForecastField.WIND,
+		device_class=SensorDeviceClass.WIND_SPEED,
+		native_unit_of_measurement=UnitOfSpeed.METERS_PER_SECOND,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		deadband=0.1,
+		value_func=lambda weather: weather.wind_gust_speed_max(12),
+	),
+}
+
+
+# Values of the area sensors come from the aggregates over the points of an area entry
+AREA_SENSORS: Dict[AreaSensorType, SensorEntityDescription] = {
+	AreaSensorType.AREA_PRECIPITATION_MAX: SensorEntityDescription(
+		key=AreaSensorType.AREA_PRECIPITATION_MAX,
+		device_class=SensorDeviceClass.PRECIPITATION_INTENSITY,
+		native_unit_of_measurement=UnitOfVolumetricFlux.MILLIMETERS_PER_HOUR,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		value_func=lambda weather: weather.precipitation_max,
+	),
+	AreaSensorType.AREA_WIND_GUST_SPEED_MAX: SensorEntityDescription(
+		key=AreaSensorType.AREA_WIND_GUST_SPEED_MAX,
 		device_class=SensorDeviceClass.WIND_SPEED,
 		native_unit_of_measurement=UnitOfSpeed.METERS_PER_SECOND,
 		suggested_display_precision=1,
 		state_class=SensorStateClass.MEASUREMENT,
-		value_func=lambda actual_weather: actual_weather.wind_gust_speed,
+		deadband=0.1,
+		value_func=lambda weather: weather.wind_gust_speed_max,
+	),
+	AreaSensorType.AREA_THUNDERSTORM_FRACTION: SensorEntityDescription(
+		key=AreaSensorType.AREA_THUNDERSTORM_FRACTION,
+		icon="mdi:weather-lightning-rainy",
+		native_unit_of_measurement=PERCENTAGE,
+		suggested_display_precision=0,
+		state_class=SensorStateClass.MEASUREMENT,
+		value_func=lambda weather: _percentage(weather.thunderstorm_fraction),
+	),
+	AreaSensorType.AREA_THUNDERSTORM_FRACTION_MAX_3H: SensorEntityDescription(
+		key=AreaSensorType.AREA_THUNDERSTORM_FRACTION_MAX_3H,
+		icon="mdi:weather-lightning-rainy",
+		native_unit_of_measurement=PERCENTAGE,
+		suggested_display_precision=0,
+		state_class=SensorStateClass.MEASUREMENT,
+		value_func=lambda weather: _percentage(weather.thunderstorm_fraction_max(3)),
+	),
+}
+
+
+# Values of the diagnostic sensors come from the location, not from the weather
+DIAGNOSTIC_SENSORS: Dict[DiagnosticSensorType, SensorEntityDescription] = {
+	DiagnosticSensorType.DATA_CHECKED: SensorEntityDescription(
+		key=DiagnosticSensorType.DATA_CHECKED,
+		device_class=SensorDeviceClass.TIMESTAMP,
+		entity_category=EntityCategory.DIAGNOSTIC,
+		entity_registry_enabled_default=False,
+		value_func=lambda location: location.data_checked,
+	),
+	DiagnosticSensorType.FAILED_REFRESHES: SensorEntityDescription(
+		key=DiagnosticSensorType.FAILED_REFRESHES,
+		icon="mdi:alert-circle-outline",
+		state_class=SensorStateClass.TOTAL_INCREASING,
+		entity_category=EntityCategory.DIAGNOSTIC,
+		entity_registry_enabled_default=False,
+		value_func=lambda location: location.fetch_stats.failed_refreshes,
+	),
+	DiagnosticSensorType.FETCH_DURATION: SensorEntityDescription(
+		key=DiagnosticSensorType.FETCH_DURATION,
+		device_class=SensorDeviceClass.DURATION,
+		native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+		suggested_display_precision=0,
+		state_class=SensorStateClass.MEASUREMENT,
+		entity_category=EntityCategory.DIAGNOSTIC,
+		entity_registry_enabled_default=False,
+		value_func=lambda location: _milliseconds(location.fetch_stats.fetch.last),
+	),
+	DiagnosticSensorType.PARSE_DURATION: SensorEntityDescription(
+		key=DiagnosticSensorType.PARSE_DURATION,
+		device_class=SensorDeviceClass.DURATION,
+		native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		entity_category=EntityCategory.DIAGNOSTIC,
+		entity_registry_enabled_default=False,
+		value_func=lambda location: _milliseconds(location.stats.parse.last),
+	),
+	DiagnosticSensorType.PAYLOAD_SIZE: SensorEntityDescription(
+		key=DiagnosticSensorType.PAYLOAD_SIZE,
+		device_class=SensorDeviceClass.DATA_SIZE,
+		native_unit_of_measurement=UnitOfInformation.BYTES,
+		state_class=SensorStateClass.MEASUREMENT,
+		entity_category=EntityCategory.DIAGNOSTIC,
+		entity_registry_enabled_default=False,
+		value_func=lambda location: location.fetch_stats.payload_size,
+	),
+	DiagnosticSensorType.UPDATE_DURATION: SensorEntityDescription(
+		key=DiagnosticSensorType.UPDATE_DURATION,
+		device_class=SensorDeviceClass.DURATION,
+		native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+		suggested_display_precision=1,
+		state_class=SensorStateClass.MEASUREMENT,
+		entity_category=EntityCategory.DIAGNOSTIC,
+		entity_registry_enabled_default=False,
+		value_func=lambda location: _milliseconds(location.stats.update.last),
 	),
 }
 
 
+def _milliseconds(seconds: float | None) -> float | None:
+	return None if seconds is None else seconds * 1000
+
+
+def _percentage(fraction: float | None) -> float | None:
+	return None if fraction is None else fraction * 100
+
+
 async def async_setup_entry(hass: HomeAssistant, config_entry: AladinOnlineConfigEntry, async_add_entities) -> None:
 	coordinator = config_entry.runtime_data
+	deadband = config_entry.options.get(CONF_DEADBAND, True)
+
+	if CONF_RADIUS in config_entry.data:
+		async_add_entities([
+			AreaSensorEntity(coordinator, config_entry.data, AREA_SENSORS[sensor_type], deadband=deadband)
+			for sensor_type in AREA_SENSORS
+		])
+		return
+
+	locations = coordinator.location_names if CONF_LOCATIONS in config_entry.data else [None]
+
+	for location in locations:
+		for sensor_type in SENSORS:
+			# Sensors of the fields that are not selected in the options are not created
+			if SENSORS[sensor_type].field not in coordinator.fields:
+				continue
+
+			async_add_entities([
+				SensorEntity(coordinator, config_entry.data, SENSORS[sensor_type], location, deadband=deadband),
+			])
 
-	for sensor_type in SENSORS:
 		async_add_entities([
-			SensorEntity(coordinator, config_entry.data, SENSORS[sensor_type]),
+			DiagnosticSensorEntity(coordinator, config_entry.data, DIAGNOSTIC_SENSORS[sensor_type], location)
+			for sensor_type in DIAGNOSTIC_SENSORS
 		])
 
 
@@ -140,36 +426,99 @@ class SensorEntity(CoordinatorEntity, ComponentSensorEntity):
 
 	_attr_has_entity_name = True
 
-	def __init__(self, coordinator: DataUpdateCoordinator, config: MappingProxyType, entity_description: SensorEntityDescription):
+	_written_available: bool | None = None
+
+	def __init__(
+		self,
+		coordinator: DataUpdateCoordinator,
+		config: MappingProxyType,
+		entity_description: SensorEntityDescription,
+		location: str | None = None,
+		deadband: bool = True,
+	):
 		super().__init__(coordinator)
 
 		self.entity_description = entity_description
 		self._attr_translation_key = entity_description.key
+		self._location: str | None = location
+		# Without the deadband every change of the value is written
+		self._deadband: float = entity_description.deadband if deadband else 0
+
+		# Every location of a batch entry is a device of its own
+		device_id = config[CONF_NAME] if location is None else "{}.{}".format(config[CONF_NAME], location)
 
 		self._attr_unique_id = "{}.{}".format(
-			config[CONF_NAME],
+			device_id,
 			self.entity_description.key,
 		)
 
 		self._attr_device_info = DeviceInfo(
-			identifiers={(DOMAIN, config[CONF_NAME])},
+			identifiers={(DOMAIN, device_id)},
 			model="Weather forecast",
-			name=config[CONF_NAME],
+			name=config[CONF_NAME] if location is None else location,
 			manufacturer=NAME,
 			entry_type=DeviceEntryType.SERVICE,
 		)
 
 		self._update_attributes()
 
+	@property
+	def _weather(self) -> AladinWeather | None:
+		return self.coordinator.get_location(self._location).weather
+
+	@property
+	def available(self) -> bool:
+		return super().available and self._weather is not None
+
 	def _update_attributes(self):
-		if self.coordinator.data is None:
+		if self._weather is None:
 			return
 
-		actual_weather: AladinActualWeather = self.coordinator.data.actual_weather
+		self._attr_native_value = self.entity_description.value_func(self._weather)
+
+	def _value_changed(self, previous_value: Any) -> bool:
+		value = self._attr_native_value
+
+		if value is None or previous_value is None:
+			return value is not previous_value
+
+		# Timestamps have no deadband
+		if not isinstance(value, (int, float)):
+			return value != previous_value
 
-		self._attr_native_value = self.entity_description.value_func(actual_weather)
+		return value != previous_value and round(abs(value - previous_value), 6) >= self._deadband
 
 	@callback
 	def _handle_coordinator_update(self) -> None:
+		previous_value = self._attr_native_value
+
 		self._update_attributes()
+
+		# Skip writes that would not change the state beyond the deadband to spare the recorder
+		if self.available == self._written_available and not self._value_changed(previous_value):
+			self._attr_native_value = previous_value
+			return
+
+		self._written_available = self.available
 		super()._handle_coordinator_update()
+
+
+class AreaSensorEntity(SensorEntity):
+
+	@property
+	def _weather(self) -> AladinAreaWeather | None:
+		return self.coordinator.data
+
+
+class DiagnosticSensorEntity(SensorEntity):
+
+	@property
+	def available(self) -> bool:
+		# Diagnostics matter the most when the refresh fails
+		return True
+
+	def _update_attributes(self):
+		self._attr_native_value = self.entity_description.value_func(self.coordinator.get_location(self._location))
+
+	def _value_changed(self, previous_value) -> bool:
+		return self._attr_native_value != previous_value
@@ -1,3 +1,5 @@
+from array import array
+from bisect import bisect_right
 from homeassistant.const import (
 	CONF_NAME,
 	UnitOfLength,
@@ -9,8 +11,11 @@ from homeassistant.components.weather import (
 	ATTR_FORECAST_CLOUD_COVERAGE,
 	ATTR_FORECAST_CONDITION,
 	ATTR_FORECAST_HUMIDITY,
+	ATTR_FORECAST_IS_DAYTIME,
 	ATTR_FORECAST_NATIVE_APPARENT_TEMP,
+	ATTR_FORECAST_NATIVE_DEW_POINT,
 	ATTR_FORECAST_NATIVE_TEMP,
+	ATTR_FORECAST_NATIVE_TEMP_LOW,
 	ATTR_FORECAST_NATIVE_PRECIPITATION,
 	ATTR_FORECAST_NATIVE_PRESSURE,
 	ATTR_FORECAST_NATIVE_WIND_GUST_SPEED,
@@ -28,16 +33,45 @@ from homeassistant.helpers.device_registry import DeviceEntryType
 from homeassistant.util import dt
 from types import MappingProxyType
 from . import AladinOnlineConfigEntry
-from .aladin_online import AladinActualWeather
+from .aggregation import AladinForecastPeriod
+from .forecast import AladinActualWeather, AladinForecast, AladinWeather
+from typing import Final, List, Tuple
 from .const import (
+	CONF_LOCATIONS,
+	CONF_RADIUS,
 	DOMAIN,
 	NAME,
 )
 
+# Forecast attributes with the columns they come from and their precision
+FORECAST_COLUMNS: Final[List[Tuple[str, str, int]]] = [
+	(ATTR_FORECAST_CLOUD_COVERAGE, "clouds", 0),
+	(ATTR_FORECAST_HUMIDITY, "humidity", 1),
+	(ATTR_FORECAST_NATIVE_APPARENT_TEMP, "apparent_temperature", 1),
+	(ATTR_FORECAST_NATIVE_DEW_POINT, "dew_point", 1),
+	(ATTR_FORECAST_NATIVE_TEMP, "temperature", 1),
+	(ATTR_FORECAST_NATIVE_PRECIPITATION, "precipitation", 1),
+	(ATTR_FORECAST_NATIVE_PRESSURE, "pressure", 1),
+	(ATTR_FORECAST_NATIVE_WIND_SPEED, "wind_speed", 1),
+	(ATTR_FORECAST_WIND_BEARING, "wind_bearing", 2),
+	(ATTR_FORECAST_NATIVE_WIND_GUST_SPEED, "wind_gust_speed", 1),
+]
+
 
 async def async_setup_entry(hass: HomeAssistant, config_entry: AladinOnlineConfigEntry, async_add_entities) -> None:
 	coordinator = config_entry.runtime_data
 
+	# An area has aggregates only, not a forecast of a place
+	if CONF_RADIUS in config_entry.data:
+		return
+
+	if CONF_LOCATIONS in config_entry.data:
+		async_add_entities([
+			WeatherEntity(coordinator, config_entry.data, location)
+			for location in coordinator.location_names
+		])
+		return
+
 	async_add_entities([
 		WeatherEntity(coordinator, config_entry.data),
 	])
@@ -51,71 +85,181 @@ class WeatherEntity(CoordinatorEntity, ComponentWeatherEntity):
 	_attr_native_pressure_unit = UnitOfPressure.HPA
 	_attr_native_temperature_unit = UnitOfTemperature.CELSIUS
 	_attr_native_wind_speed_unit = UnitOfSpeed.METERS_PER_SECOND
-	_attr_supported_features = WeatherEntityFeature.FORECAST_HOURLY
+	_attr_supported_features = (
+		WeatherEntityFeature.FORECAST_HOURLY
+		| WeatherEntityFeature.FORECAST_DAILY
+		| WeatherEntityFeature.FORECAST_TWICE_DAILY
+	)
 
 	_forecast: list[Forecast] | None = None
+	_forecast_timestamps: array | memoryview | None = None
+	_forecast_source: AladinForecast | None = None
+	_daily_forecast: List[tuple[AladinForecastPeriod, Forecast]] | None = None
+	_twice_daily_forecast: List[tuple[AladinForecastPeriod, Forecast]] | None = None
 
-	def __init__(self, coordinator: DataUpdateCoordinator, config: MappingProxyType):
+	_written_data: AladinWeather | None = None
+	_written_available: bool | None = None
+
+	def __init__(self, coordinator: DataUpdateCoordinator, config: MappingProxyType, location: str | None = None):
 		super().__init__(coordinator)
 
+		self._location: str | None = location
+
+		# Every location of a batch entry is a device of its own
+		device_id = config[CONF_NAME] if location is None else "{}.{}".format(config[CONF_NAME], location)
+
 		self._attr_unique_id = "{}.{}".format(
-			config[CONF_NAME],
+			device_id,
 			"hourly",
 		)
 
 		self._attr_device_info = DeviceInfo(
-			identifiers={(DOMAIN, config[CONF_NAME])},
+			identifiers={(DOMAIN, device_id)},
 			model="Weather forecast",
-			name=config[CONF_NAME],
+			name=config[CONF_NAME] if location is None else location,
 			manufacturer=NAME,
 			entry_type=DeviceEntryType.SERVICE,
 		)
 
 		self._update_attributes()
 
+	@property
+	def _weather(self) -> AladinWeather | None:
+		return self.coordinator.get_location(self._location).weather
+
+	@property
+	def available(self) -> bool:
+		return super().available and self._weather is not None
+
 	def _update_attributes(self):
-		if self.coordinator.data is None:
+		if self._weather is None:
 			return
 
-		actual_weather: AladinActualWeather = self.coordinator.data.actual_weather
+		actual_weather: AladinActualWeather = self._weather.actual_weather
 
 		self._attr_condition = actual_weather.condition
-		self._attr_humidity = round(actual_weather.humidity, 1)
-		self._attr_native_pressure = round(actual_weather.pressure, 1)
-		self._attr_native_temperature = round(actual_weather.temperature, 1)
-		self._attr_native_wind_speed = round(actual_weather.wind_speed, 1)
-		self._attr_wind_bearing = round(actual_weather.wind_bearing, 2)
-		self._attr_native_wind_gust_speed = round(actual_weather.wind_gust_speed, 1)
-		self._attr_native_apparent_temperature = round(actual_weather.apparent_temperature, 1)
-		self._attr_cloud_coverage = int(round(actual_weather.clouds))
+		self._attr_humidity = _round(actual_weather.humidity, 1)
+		self._attr_native_pressure = _round(actual_weather.pressure, 1)
+		self._attr_native_temperature = _round(actual_weather.temperature, 1)
+		self._attr_native_wind_speed = _round(actual_weather.wind_speed, 1)
+		self._attr_wind_bearing = _round(actual_weather.wind_bearing, 2)
+		self._attr_native_wind_gust_speed = _round(actual_weather.wind_gust_speed, 1)
+		self._attr_native_apparent_temperature = _round(actual_weather.apparent_temperature, 1)
+		self._attr_cloud_coverage = _round(actual_weather.clouds, 0)
+		self._attr_native_dew_point = _round(actual_weather.dew_point, 1)
 
-		now = dt.now()
+		# The serialized forecast is kept until the coordinator brings a new one
+		if self._weather.forecast is not self._forecast_source:
+			self._forecast_source = self._weather.forecast
+			self._forecast = None
+			self._daily_forecast = None
+			self._twice_daily_forecast = None
 
-		self._forecast: list[Forecast] = []
+	def _build_forecast(self) -> None:
+		forecast: AladinForecast = self._weather.forecast
+		start = max(self._weather.actual_index + 1, forecast.index_after(dt.now()))
 
-		for hourly_forecast in self.coordinator.data.hourly_forecasts:
-			if hourly_forecast.datetime < now:
-				continue
+		self._forecast_timestamps = forecast.timestamps[start:]
+		self._forecast = []
 
-			self._forecast.append({
+		# Only the fields selected in the options are exposed
+		columns = [(attribute, column, digits) for attribute, column, digits in FORECAST_COLUMNS if getattr(forecast, column) is not None]
+
+		for i in range(start, len(forecast)):
+			hourly_forecast = forecast.row(i)
+
+			item: Forecast = {
 				ATTR_FORECAST_TIME: hourly_forecast.datetime.isoformat(),
 				ATTR_FORECAST_CONDITION: hourly_forecast.condition,
-				ATTR_FORECAST_CLOUD_COVERAGE: int(round(hourly_forecast.clouds)),
-				ATTR_FORECAST_HUMIDITY: hourly_forecast.humidity,
-				ATTR_FORECAST_NATIVE_APPARENT_TEMP: round(hourly_forecast.apparent_temperature, 1),
-				ATTR_FORECAST_NATIVE_TEMP: round(hourly_forecast.temperature, 1),
-				ATTR_FORECAST_NATIVE_PRECIPITATION: round(hourly_forecast.precipitation, 1),
-				ATTR_FORECAST_NATIVE_PRESSURE: round(hourly_forecast.pressure, 1),
-				ATTR_FORECAST_NATIVE_WIND_SPEED: round(hourly_forecast.wind_speed, 1),
-				ATTR_FORECAST_WIND_BEARING: round(hourly_forecast.wind_bearing, 2),
-				ATTR_FORECAST_NATIVE_WIND_GUST_SPEED: round(hourly_forecast.wind_gust_speed, 1),
-			})
+			}
+			for attribute, column, digits in columns:
+				item[attribute] = _round(getattr(hourly_forecast, column), digits)
+
+			self._forecast.append(item)
+
+	def _trim_forecast(self) -> None:
+		# Drop the hours that have already started
+		passed = bisect_right(self._forecast_timestamps, dt.utcnow().timestamp())
+		if passed > 0:
+			self._forecast = self._forecast[passed:]
+			self._forecast_timestamps = self._forecast_timestamps[passed:]
 
 	async def async_forecast_hourly(self) -> list[Forecast] | None:
-		self._update_attributes()
+		if self._weather is None:
+			return None
+
+		if self._forecast is None:
+			self._build_forecast()
+		else:
+			self._trim_forecast()
+
 		return self._forecast
 
+	async def async_forecast_daily(self) -> list[Forecast] | None:
+		if self._weather is None:
+			return None
+
+		if self._daily_forecast is None:
+			self._daily_forecast = WeatherEntity._format_periods(self._weather.forecast.aggregates.daily)
+
+		return WeatherEntity._current_periods(self._daily_forecast)
+
+	async def async_forecast_twice_daily(self) -> list[Forecast] | None:
+		if self._weather is None:
+			return None
+
+		if self._twice_daily_forecast is None:
+			self._twice_daily_forecast = WeatherEntity._format_periods(self._weather.forecast.aggregates.twice_daily)
+
+		return WeatherEntity._current_periods(self._twice_daily_forecast)
+
+	@staticmethod
+	def _format_periods(periods: List[AladinForecastPeriod]) -> List[tuple[AladinForecastPeriod, Forecast]]:
+		formatted = []
+
+		for period in periods:
+			forecast: Forecast = {
+				ATTR_FORECAST_TIME: period.start.isoformat(),
+				ATTR_FORECAST_CONDITION: period.condition,
+				ATTR_FORECAST_NATIVE_TEMP: _round(period.temperature, 1),
+				ATTR_FORECAST_NATIVE_TEMP_LOW: _round(period.templow, 1),
+				ATTR_FORECAST_NATIVE_PRECIPITATION: _round(period.precipitation, 1),
+				ATTR_FORECAST_NATIVE_WIND_SPEED: _round(period.wind_speed, 1),
+				ATTR_FORECAST_NATIVE_WIND_GUST_SPEED: _round(period.wind_gust_speed, 1),
+			}
+			if period.is_daytime is not None:
+				forecast[ATTR_FORECAST_IS_DAYTIME] = period.is_daytime
+
+			formatted.append((period, forecast))
+
+		return formatted
+
+	@staticmethod
+	def _current_periods(periods: List[tuple[AladinForecastPeriod, Forecast]]) -> list[Forecast]:
+		now = dt.now()
+		return [forecast for period, forecast in periods if period.end > now]
+
 	@callback
 	def _handle_coordinator_update(self) -> None:
+		# The coordinator passes the same data when neither the forecast nor the current hour changed
+		if self._weather is self._written_data and self.available == self._written_available:
+			return
+
+		self._written_data = self._weather
+		self._written_available = self.available
+
+		forecast_source = self._forecast_source
+
 		self._update_attributes()
 		super()._handle_coordinator_update()
+
+		if self._forecast_source is not forecast_source:
+			self.hass.async_create_task(self.async_update_listeners(None))
+
+
+def _round(value: float | None, digits: int) -> float | int | None:
+	if value is None:
+		return None
+
+	# Cloud coverage is a whole percentage
+	return int(round(value)) if digits == 0 else round(value, digits)